@@ -0,0 +1,45 @@
+"""
+Micro-benchmark of the per-task handler dispatch overhead.
+
+Compares calling a handler with signature inspection on every call (how
+Task.process worked before call plans) with the precompiled CallPlan.
+
+    python benchmarks/dispatch.py [number]
+"""
+
+import inspect
+import sys
+import timeit
+
+from logicoma import core
+
+
+def handler(client, url, groups):
+    pass
+
+
+def inspecting_dispatch(task, client):
+    args = {'client': client, 'url': task.url, 'data': task.data,
+            'groups': task.handler.groups(task.url)}
+    params = inspect.signature(task.handler.func).parameters.values()
+    if any(param.kind == param.VAR_KEYWORD for param in params):
+        return task.handler(**args)
+    names = set(param.name for param in params
+                if param.kind == param.POSITIONAL_OR_KEYWORD)
+    return task.handler(**{k: v for k, v in args.items() if k in names})
+
+
+def main(number=100000):
+    task = core.Task('https://example.com/item/1',
+                     handler=core.Handler(handler, r'/item/(\d+)'))
+    results = {
+        'inspect': timeit.timeit(lambda: inspecting_dispatch(task, None),
+                                 number=number),
+        'call plan': timeit.timeit(lambda: task.process(None), number=number),
+    }
+    for name, total in results.items():
+        print('{:>10}: {:6.2f} us/task'.format(name, total / number * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Download throughput benchmark against a local HTTP server.
+
+Compares small chunks (the old 4 KiB default) with bigger chunk sizes.
+
+    python benchmarks/download.py [size_mib]
+"""
+
+import http.server
+import sys
+import tempfile
+import threading
+import time
+
+from logicoma import core
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    content = b''
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+def main(size_mib=128):
+    Handler.content = bytes(size_mib * 1024 * 1024)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/file.bin'.format(server.server_port)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        client = core.Client(tmpdir)
+        for chunk_size in (4096, 65536, client.DOWNLOAD_CHUNK_SIZE,
+                           1024 * 1024):
+            start = time.perf_counter()
+            client.download(url, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            print('chunk {:>8} B: {:7.1f} MiB/s'.format(
+                chunk_size, size_mib / elapsed))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
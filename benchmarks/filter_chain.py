@@ -0,0 +1,72 @@
+"""
+Benchmark of queue filter chains at high link fan-out.
+
+Compares a chain of plain filter functions (scheme check, domain allowlist,
+extension blocklist and deduplication) called task by task, with the same
+chain built from declarative filters, called task by task and by the batch
+FilterChain.filter().
+
+    python benchmarks/filter_chain.py [number of links]
+"""
+
+import sys
+import time
+
+from logicoma import core, filters, utils
+
+
+DOMAINS = ('example.com', 'example.org')
+EXTENSIONS = ('.jpg', '.png', '.pdf', '.zip')
+
+
+def function_chain():
+    chain = utils.FilterChain()
+    chain.append(lambda task: task.url.startswith(('http://', 'https://')))
+    chain.append(lambda task: any(
+        host == d or host.endswith('.' + d)
+        for host in [utils.url_host(task.url) or ''] for d in DOMAINS))
+    chain.append(lambda task: utils.url_fileext(task.url).lower()
+                 not in EXTENSIONS)
+    chain.append(filters.DuplicateFilter())
+    return chain
+
+
+def declarative_chain():
+    chain = utils.FilterChain()
+    chain.extend([filters.SchemeFilter(), filters.DomainFilter(DOMAINS),
+                  filters.ExtensionFilter(EXTENSIONS, exclude=True),
+                  filters.DuplicateFilter()])
+    return chain
+
+
+def make_urls(number):
+    hosts = ('example.com', 'www.example.org', 'cdn.example.com', 'other.net')
+    paths = ('/item/{}', '/img/{}.jpg', '/page/{}?a=1', '/doc/{}.pdf')
+    return ['https://{}{}'.format(hosts[i % 4], paths[i // 4 % 4].format(
+        i % (number // 2))) for i in range(number)]
+
+
+def run(chain, urls, batch):
+    tasks = [core.Task(url) for url in urls]
+    start = time.perf_counter()
+    if batch:
+        passed = chain.filter(tasks)
+    else:
+        passed = [task for task in tasks if chain(task)]
+    return time.perf_counter() - start, len(passed)
+
+
+def main(number=200000):
+    urls = make_urls(number)
+    results = [
+        ('functions', run(function_chain(), urls, False)),
+        ('declarative', run(declarative_chain(), urls, False)),
+        ('batch', run(declarative_chain(), urls, True)),
+    ]
+    for name, (elapsed, passed) in results:
+        print('{:>12}: {:6.2f} us/task, {} passed'.format(
+            name, elapsed / number * 1e6, passed))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
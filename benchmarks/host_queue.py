@@ -0,0 +1,43 @@
+"""
+Benchmark of host queues with many hosts.
+
+Every host has a few queued tasks and a rate limit, so most hosts are waiting
+for the throttle. Measures put and get of one task with HostQueue and
+RoundRobinQueue, the time shouldn't grow with number of hosts.
+
+    python benchmarks/host_queue.py [number of operations]
+"""
+
+import sys
+import time
+
+from logicoma import core, scheduler
+
+
+HOSTS = (10, 100, 1000, 10000)
+
+
+def run(queue_class, hosts, number):
+    q = queue_class(scheduler.Throttle(rate=1000))
+    for i in range(hosts * 4):
+        q.put(core.Task('http://{}.com/{}'.format(i % hosts, i)))
+    tasks = [core.Task('http://{}.com/new'.format(i % hosts))
+             for i in range(number)]
+    start = time.perf_counter()
+    for task in tasks:
+        q.put(task)
+        q.get()
+        q.task_done()
+    return time.perf_counter() - start
+
+
+def main(number=20000):
+    for queue_class in (scheduler.HostQueue, scheduler.RoundRobinQueue):
+        for hosts in HOSTS:
+            elapsed = run(queue_class, hosts, number)
+            print('{:>15} {:>6} hosts: {:6.2f} us/task'.format(
+                queue_class.__name__, hosts, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
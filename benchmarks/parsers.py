@@ -0,0 +1,74 @@
+"""
+Benchmark of HTML parsers on sample pages.
+
+Sample pages are given as file names, if no file is given then generated page
+is used. Parsers which are not installed are skipped. Link extraction from the
+parsed document is compared with the streaming LinkExtractor.
+
+    python benchmarks/parsers.py [page.html ...]
+"""
+
+import sys
+import timeit
+
+import bs4
+
+from logicoma import parsing, utils
+
+PARSERS = ['html5lib', 'lxml', 'html.parser', 'selectolax']
+
+
+def sample_page(links=2000):
+    items = ''.join('<li><a href="/item/{0}">Item {0}</a> <span>{0}</span>'
+                    '</li>'.format(i) for i in range(links))
+    return '<html><head><title>Sample</title></head><body><ul>{}</ul>' \
+           '</body></html>'.format(items)
+
+
+def main(files):
+    pages = [open(f, encoding='utf-8', errors='replace').read()
+             for f in files] or [sample_page()]
+    size = sum(map(len, pages)) / 1024
+    for parser in PARSERS:
+        try:
+            parsing.parse('', parser)
+        except (ImportError, bs4.FeatureNotFound):
+            print('{:>14}: not installed'.format(parser))
+            continue
+        number = 5
+        total = timeit.timeit(
+            lambda: [parsing.parse(page, parser) for page in pages],
+            number=number)
+        print('{:>14}: {:8.1f} ms/page {:8.1f} KiB/s'.format(
+            parser, total / number / len(pages) * 1000,
+            size * number / total))
+    strainer = bs4.SoupStrainer('a')
+    total = timeit.timeit(
+        lambda: [parsing.parse(page, 'html.parser', strainer)
+                 for page in pages],
+        number=5)
+    print('{:>14}: {:8.1f} ms/page (html.parser, <a> only)'.format(
+        'SoupStrainer', total / 5 / len(pages) * 1000))
+
+    url = 'https://example.com/list/'
+
+    def document_links(page):
+        return [utils.url_normalize(utils.url_join(url, a['href']))
+                for a in parsing.parse(page, 'html5lib').find_all(
+                    'a', href=True)]
+
+    def streamed_links(page):
+        data = page.encode('utf-8')
+        chunks = (data[i:i + 65536] for i in range(0, len(data), 65536))
+        return list(parsing.extract_links(chunks, url, 'utf-8'))
+
+    for name, func in (('find_all', document_links),
+                       ('LinkExtractor', streamed_links)):
+        total = timeit.timeit(lambda: [func(page) for page in pages],
+                              number=5)
+        print('{:>14}: {:8.1f} ms/page (links)'.format(
+            name, total / 5 / len(pages) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
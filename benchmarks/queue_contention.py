@@ -0,0 +1,62 @@
+"""
+Benchmark of task queues under contention.
+
+Every thread puts tasks with typical crawler priorities (starter, default
+and retried tasks) and gets them back, all threads share one queue. Compares
+the heap based TaskQueue with per-priority deques of LevelQueue.
+
+    python benchmarks/queue_contention.py [tasks per thread]
+"""
+
+import sys
+import threading
+import time
+
+from logicoma import core
+
+
+PRIORITIES = (-1, 0, 0, 0, 0, 0, 0, 1)
+THREADS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def run(queue_class, threads, tasks):
+    q = queue_class()
+    # Tasks already waiting in the queue, so heap operations are not trivial.
+    for i in range(10000):
+        q.put(core.Task('pending', priority=PRIORITIES[i % len(PRIORITIES)]))
+    batch = [core.Task('task', priority=PRIORITIES[i % len(PRIORITIES)])
+             for i in range(tasks)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for task in batch:
+            q.put(task)
+            q.get()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+
+def main(tasks=20000):
+    queues = (core.TaskQueue, core.LevelQueue)
+    print('{:>7} {}'.format('threads', ' '.join(
+        '{:>16}'.format(q.__name__) for q in queues)))
+    for threads in THREADS:
+        per_thread = max(tasks // threads, 1000)
+        results = []
+        for queue_class in queues:
+            elapsed = run(queue_class, threads, per_thread)
+            results.append(threads * per_thread / elapsed / 1000)
+        print('{:>7} {}'.format(threads, ' '.join(
+            '{:>10.1f} kops/s'.format(r) for r in results)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,28 @@
+"""
+Memory benchmark of queued tasks, reports bytes per task in TaskQueue.
+
+    python benchmarks/task_memory.py [number]
+"""
+
+import sys
+import tracemalloc
+
+from logicoma import core
+
+
+def main(number=100000):
+    urls = ['https://example.com/item/{}'.format(i) for i in range(number)]
+    handler = core.Handler(lambda: None, r'/item/')
+    q = core.TaskQueue()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for url in urls:
+        q.put(core.Task(url, handler=handler))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{:.1f} bytes per queued task (URL excluded)'.format(
+        (after - before) / number))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -28,6 +28,8 @@ def filter_insecure(task):
 
 # Register class as filter. If filter is class, then instance will be created
 # only once immediately after registering so it is stateful filter.
+# This is just an example, logicoma.DuplicateFilter is thread-safe, normalizes
+# URLs and can keep seen URLs in the Bloom filter or on disk.
 @crawler.queue_filter()
 class DuplicateFilter:
     def __init__(self):
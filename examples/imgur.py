@@ -37,6 +37,10 @@ def imgur_image(url):
 @click.option('-c', '--count', type=int, default=1, help='Number of threads')
 @click.argument('links', nargs=-1)
 def cli(**kwargs):
+    # Remember downloaded files, so they are not downloaded again when the
+    # crawler is run again.
+    crawler.client = logicoma.Client(
+        manifest=logicoma.DownloadManifest('downloads.db'))
     # All *args and **kwargs are via start function passed to starter function.
     # Click command parameters are passed as **kwargs so we use this trick :).
     crawler(**kwargs)
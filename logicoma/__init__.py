@@ -5,9 +5,18 @@ aims to make simple web crawlers as quick as possible.
 
 __version__ = '0.4'
 
-from .core import *     # noqa: F401,F403
-from .tasks import *    # noqa: F401,F403
-from .utils import *    # noqa: F401,F403
+from .core import *         # noqa: F401,F403
+from .tasks import *        # noqa: F401,F403
+from .utils import *        # noqa: F401,F403
+from .aio import *          # noqa: F401,F403
+from .scheduler import *    # noqa: F401,F403
+from .filters import *      # noqa: F401,F403
+from .persist import *      # noqa: F401,F403
+from .parsing import *      # noqa: F401,F403
+from .manifest import *     # noqa: F401,F403
+from .cache import *        # noqa: F401,F403
+from .metrics import *      # noqa: F401,F403
+from .retry import *        # noqa: F401,F403
 
 
 def crawler():
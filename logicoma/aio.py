@@ -0,0 +1,331 @@
+"""
+Asynchronous crawling engine built on asyncio.
+
+Handlers, starters and filters are registered the same way as for the
+Crawler. Handlers can be coroutine functions (or asynchronous generators),
+those get AsyncClient as `client` argument. Ordinary handlers are run in the
+thread pool with the synchronous Client, so existing crawlers work unchanged.
+"""
+
+__all__ = ['AsyncClient', 'AsyncCrawler']
+
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import itertools
+import logging
+
+import time
+
+from .core import Abort, Client, Crawler, Stop
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncClient:
+    """
+    Asynchronous HTTP client.
+
+    Wraps synchronous `client`, blocking requests are done in the `executor`
+    (default executor of the loop if None) and request delays are awaited
+    without blocking any thread.
+
+    Requests are not non-blocking, every request in flight occupies a thread
+    of the executor. So number of concurrent requests is limited by size of
+    the executor, thousands of them need thousands of threads.
+    """
+
+    def __init__(self, client=None, executor=None):
+        self.client = client or Client()
+        self.executor = executor
+
+    def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor,
+                                    functools.partial(func, *args, **kwargs))
+
+    async def request(self, method, url, delay=0, **kwargs):
+        """
+        Do a HTTP request to the given url.
+
+        See: Client.request()
+        """
+        response = self.client.cached(method, url, **kwargs)
+        if response is not None:
+            return response
+        delay = max(self.client.requests_delay, delay)
+        if delay > 0:
+            logger.debug('Request delay %.1f seconds', delay)
+            await asyncio.sleep(delay)
+        return await self._run(self.client.send, method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        """Shortcut for request('GET', ...)."""
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """Shortcut for request('POST', ...)."""
+        return await self.request('POST', url, **kwargs)
+
+    async def request_page(self, method, url, parser=None, parse_only=None,
+                           lazy=None, **kwargs):
+        """
+        Shortcut to do a HTTP request and parse text response.
+
+        See: Client.request_page()
+        """
+        response = await self.request(method, url, **kwargs)
+        if response.ok:
+            return response, await self._run(self.client.parse, response,
+                                             parser, parse_only, lazy)
+        return response, None
+
+    async def get_page(self, url, **kwargs):
+        """Shortcut for request_page('GET', ...)."""
+        return await self.request_page('GET', url, **kwargs)
+
+    async def links(self, url, **kwargs):
+        """
+        Returns list of links of the HTML page, page is received and parsed
+        in the executor.
+
+        See: Client.links()
+        """
+        return await self._run(lambda: list(self.client.links(url, **kwargs)))
+
+    async def download(self, url, filename=None, method='GET', **kwargs):
+        """
+        Download file and returns its filename and size. Download is done in
+        the executor.
+
+        See: Client.download()
+        """
+        return await self._run(self.client.download, url, filename, method,
+                               **kwargs)
+
+
+class AsyncTaskQueue(asyncio.PriorityQueue):
+    """
+    Asynchronous variant of the TaskQueue. Tasks are put without waiting, so
+    the queue can be filled from both coroutines and synchronous code running
+    in the event loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counter = itertools.count()
+
+    def put(self, task, block=False):
+        task._seq = next(self._counter)
+        self.put_nowait(task)
+
+    def tasks(self):
+        """Returns list of queued tasks."""
+        return list(self._queue)
+
+
+class AsyncCrawler(Crawler):
+    """
+    Crawler which processes tasks in asyncio event loop. Argument `count` of
+    the start() is number of concurrently processed tasks.
+
+    Synchronous handlers and blocking requests are run in the `executor`
+    (default executor of the loop if None), which also limits their
+    concurrency (see: AsyncClient). Default executor has a few threads only
+    (min(32, CPUs + 4) since Python 3.8), start() replaces it by executor of
+    `threads` threads. Give `executor` of the required size when
+    start_async() runs in your own event loop.
+
+    Retries of failed tasks are delayed by the event loop. Crawler can be
+    stopped by stop() from any thread, or by cancelling start_async().
+    """
+
+    def __init__(self, starter_fun=None, executor=None):
+        super().__init__(starter_fun)
+        self.queue = AsyncTaskQueue()
+        self.executor = executor
+        self.async_client = None
+        # Timer handles of delayed retries mapped to their tasks.
+        self._retries = {}
+        self._loop = None
+        self._workers = []
+
+    async def _process(self, task):
+        """Process task and returns list of next tasks."""
+        if task.handler and task.call_plan.is_async:
+            next_tasks = task.process(self.async_client)
+            if inspect.isasyncgen(next_tasks):
+                return [t async for t in next_tasks]
+            return await next_tasks
+        # Generators must be consumed in the executor too, they are executed
+        # while iterating.
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, lambda: list(task.process(self.client) or []))
+
+    async def _worker(self):
+        while True:
+            task = await self.queue.get()
+            if isinstance(task, Stop):
+                break
+            if self._stop_evt.is_set():
+                # Task got while stopping is kept for on_stop.
+                self.queue.put(task, False)
+                self.queue.task_done()
+                break
+            start = self._task_started()
+            try:
+                self._push_next_tasks(await self._process(task), task)
+                logger.debug('%s finished', task)
+                self._task_finished(task, start, 'finished')
+            except Exception as e:
+                self._task_failed(task, start, e)
+            self.queue.task_done()
+
+    def _schedule_retry(self, task, delay):
+        loop = asyncio.get_event_loop()
+        handle = loop.call_later(delay, lambda: self._push_retry(handle))
+        self._retries[handle] = task
+
+    def _push_retry(self, handle):
+        self._push_delayed(self._retries.pop(handle))
+
+    def stop(self, timeout=None):
+        """See: Crawler.stop()"""
+        super().stop(timeout)
+        if self._loop is not None:
+            # Abort has the highest priority, so waiting workers are woken up
+            # immediately.
+            for _ in self._workers:
+                self._loop.call_soon_threadsafe(self.queue.put, Abort())
+
+    def _reset(self):
+        super()._reset()
+        # Queue is bound to the event loop of the previous crawling, tasks are
+        # moved to a new one, except Abort not taken by stopped workers.
+        tasks = sorted(task for task in self.queue.tasks()
+                       if not isinstance(task, Stop))
+        self.queue = type(self.queue)()
+        for task in tasks:
+            self.queue.put(task)
+
+    async def _join_workers(self, workers):
+        """Wait for workers, until the deadline if crawler is stopped."""
+        timeout = None
+        if self._deadline is not None:
+            timeout = max(0, self._deadline - time.monotonic())
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        if pending:
+            logger.warning('%d workers did not finish in time', len(pending))
+            for worker in pending:
+                worker.cancel()
+
+    async def _wait_idle(self, workers):
+        """
+        Wait until all tasks (including delayed ones) are processed, or until
+        some worker stops (eg. by Abort).
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            join = asyncio.ensure_future(self.queue.join())
+            done, _ = await asyncio.wait(
+                [join] + workers, return_when=asyncio.FIRST_COMPLETED)
+            if join not in done:
+                join.cancel()
+                return
+            if not self._retries:
+                return
+            await asyncio.sleep(min(handle.when() for handle in self._retries)
+                                - loop.time())
+
+    async def start_async(self, *args, count=1, resume=False, **kwargs):
+        """
+        Coroutine which does the crawling with `count` concurrent tasks.
+
+        Starter function can be also asynchronous generator.
+
+        See: Crawler.start()
+        """
+        self._reset()
+        restored = 0
+        if resume:
+            if not hasattr(self.queue, 'restore'):
+                raise TypeError('queue is not persistent')
+            restored = self.queue.restore(self.handler_list)
+        self._open_process_pool()
+        if self.async_client is None:
+            self.async_client = AsyncClient(self.client, self.executor)
+        self._setup_metrics(count)
+        self._loop = asyncio.get_event_loop()
+        workers = self._workers = [asyncio.ensure_future(self._worker())
+                                   for _ in range(count)]
+        if self.progress is not None:
+            self.progress.start()
+        try:
+            tasks = [] if restored else self.starter_fun(*args, **kwargs)
+            if inspect.isasyncgen(tasks):
+                async for task in tasks:
+                    if self._stop_evt.is_set():
+                        break
+                    self._push_starter_task(task)
+            else:
+                for batch in self._starter_batches(tasks):
+                    if self._stop_evt.is_set():
+                        break
+                    self.push_tasks(batch)
+                    # Let workers process tasks while starter is iterated.
+                    await asyncio.sleep(0)
+            await self._wait_idle(workers)
+            if not self._stop_evt.is_set():
+                for _ in workers:
+                    self.queue.put(Stop())
+            await self._join_workers(workers)
+        except asyncio.CancelledError:
+            self._stop_evt.set()
+            for worker in workers:
+                worker.cancel()
+            raise
+        finally:
+            for handle, task in self._retries.items():
+                handle.cancel()
+                if self._stop_evt.is_set():
+                    self.queue.put(task)
+            self._retries.clear()
+            self._loop = None
+            if self._stop_evt.is_set():
+                self._stopped()
+            if self.progress is not None:
+                self.progress.stop()
+            self._close_process_pool()
+
+    def start(self, *args, count=1, threads=None, pool_maxsize=None,
+              pool_connections=None, max_retries=None, keep_alive=None,
+              thread_sessions=None, resume=False, **kwargs):
+        """
+        Start the crawling in a new event loop, blocks until all tasks are
+        processed.
+
+        Synchronous handlers and requests are run in the default executor of
+        `threads` threads (defaults to `count`), unless crawler has its own
+        `executor`. Connection pool of the client is enlarged to
+        `pool_maxsize`, by default to number of threads, other options of
+        the client are changed if they are given.
+
+        See: start_async(), Crawler.start()
+        """
+        threads = threads or count
+        self._configure_client(pool_maxsize or threads, pool_connections,
+                               max_retries, keep_alive, thread_sessions)
+        loop = asyncio.new_event_loop()
+        if self.executor is None:
+            # Closed loop shuts down its default executor.
+            loop.set_default_executor(
+                concurrent.futures.ThreadPoolExecutor(threads))
+        try:
+            return loop.run_until_complete(
+                self.start_async(*args, count=count, resume=resume,
+                                 **kwargs))
+        finally:
+            loop.close()
@@ -0,0 +1,164 @@
+"""
+HTTP response cache.
+"""
+
+__all__ = ['ResponseCache']
+
+import email.utils
+import hashlib
+import logging
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses in SQLite database `path`, used by the
+    Client (see: Client.cache).
+
+    Responses are keyed by method, URL and body of the request. Only requests
+    with HTTP method from `methods` and responses with cacheable status code
+    are cached, streamed requests (eg. downloads) are not cached.
+
+    Freshness of the response is given by Cache-Control and Expires headers,
+    responses without them or with 'no-store' are not cached. If `ttl` is
+    given, then it overrides the headers and every response is cached for
+    `ttl` seconds.
+
+    When the size of cached responses exceeds `max_size` bytes, then least
+    recently used responses are evicted. Cache can be used by multiple threads.
+    """
+
+    CACHEABLE_STATUS = {200, 203, 300, 301, 308, 404, 410}
+
+    def __init__(self, path, max_size=1024 ** 3, ttl=None,
+                 methods=('GET', 'HEAD')):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.methods = set(methods)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses '
+                         '(key BLOB PRIMARY KEY, expires REAL, accessed REAL, '
+                         'size INTEGER, response BLOB)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                         'ON responses (accessed)')
+        self._size = self._db.execute(
+            'SELECT coalesce(sum(size), 0) FROM responses').fetchone()[0]
+
+    def key(self, method, url, kwargs):
+        """
+        Returns key of the request or None if the request is not cacheable.
+        Arguments are the same as for the Client.request().
+        """
+        if method.upper() not in self.methods or kwargs.get('stream'):
+            return None
+        request = requests.Request(method.upper(), url,
+                                   params=kwargs.get('params'),
+                                   data=kwargs.get('data'),
+                                   json=kwargs.get('json')).prepare()
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode()
+        return hashlib.sha256(b'\0'.join((request.method.encode(),
+                                          request.url.encode(), body)))\
+            .digest()
+
+    def freshness(self, response):
+        """Returns number of seconds the response is fresh."""
+        if self.ttl is not None:
+            return self.ttl
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return 0
+        match = re.search(r'(?:s-maxage|max-age)=(\d+)', cache_control)
+        if match:
+            return int(match.group(1))
+        expires = response.headers.get('Expires')
+        if expires:
+            try:
+                return email.utils.parsedate_to_datetime(expires).timestamp()\
+                    - time.time()
+            except (TypeError, ValueError):
+                return 0
+        return 0
+
+    def get(self, method, url, kwargs):
+        """Returns fresh cached response of the request or None."""
+        key = self.key(method, url, kwargs)
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT expires, response FROM responses '
+                                   'WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] < now:
+                self.misses += 1
+                return None
+            with self._db:
+                self._db.execute('UPDATE responses SET accessed = ? '
+                                 'WHERE key = ?', (now, key))
+            self.hits += 1
+        response = pickle.loads(row[1])
+        response.from_cache = True
+        logger.debug('%s %s from cache', method, url)
+        return response
+
+    def put(self, method, url, kwargs, response):
+        """Store response of the request if it's cacheable."""
+        key = self.key(method, url, kwargs)
+        if key is None or response.status_code not in self.CACHEABLE_STATUS:
+            return
+        freshness = self.freshness(response)
+        if freshness <= 0:
+            return
+        data = pickle.dumps(response)
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+            if row:
+                self._size -= row[0]
+            self._db.execute('INSERT OR REPLACE INTO responses '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (key, now + freshness, now, len(data), data))
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_size:
+            rows = self._db.execute('SELECT key, size FROM responses '
+                                    'ORDER BY accessed LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._size -= size
+                if self._size <= self.max_size:
+                    break
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+            self._size = 0
+
+    @property
+    def size(self):
+        """Size of cached responses in bytes."""
+        return self._size
+
+    def close(self):
+        with self._lock:
+            self._db.close()
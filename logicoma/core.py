@@ -2,20 +2,32 @@
 This module defines core set of classes for the crawler.
 """
 
-__all__ = ['Client', 'Task', 'Stop', 'Abort', 'Crawler']
+__all__ = ['Client', 'Task', 'Stop', 'Abort', 'AbortableQueue', 'LevelQueue',
+           'Crawler']
 
 import logging
 import os
 import queue
 import re
 import bisect
+import collections
+import concurrent.futures
 import threading
 import inspect
+import itertools
+import hashlib
+import heapq
 import time
+import types
+import weakref
 import requests
-import bs4
+import requests.adapters
 
 from . import utils
+from . import parsing
+from . import metrics
+from . import retry
+from . import scheduler
 
 
 logger = logging.getLogger(__name__)
@@ -25,22 +37,147 @@ class Client:
     """HTTP client."""
 
     USER_AGENT = 'Logicoma'
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024
+    LINKS_CHUNK_SIZE = 64 * 1024
 
     def __init__(self, working_dir='.', headers=None, cookies=None,
-                 requests_delay=0):
+                 requests_delay=0, pool_connections=10, pool_maxsize=10,
+                 max_retries=0, keep_alive=True, thread_sessions=False,
+                 parser='html5lib', lazy=False, manifest=None, cache=None,
+                 page_cache=None, metrics=None, limiter=None):
         """
         If `requests_delay` is greater than 0 then every request is delayed by
         a specified number of seconds. Delay should be used to reduce the
-        servers or network load.
+        servers or network load. Delay blocks the thread, per-host rate
+        limits without blocking can be set by HostQueue.
+
+        Connections are pooled, `pool_connections` is number of hosts to keep
+        connections to and `pool_maxsize` is number of connections kept per
+        host, it should be at least number of threads which use this client.
+        `max_retries` is number of retries of failed connections, it can be
+        also instance of urllib3.util.Retry. If `keep_alive` is False then
+        connections are closed after every request.
+
+        Session is shared by all threads by default. If `thread_sessions` is
+        True, then every thread uses its own session. Headers and cookies are
+        shared by all sessions.
+
+        Pages are parsed by `parser` (see: parsing.parse()). If `lazy` is
+        True, then pages are parsed on the first access (see: LazyPage).
+        Parsed pages are reused for identical responses if `page_cache` is
+        given (see: PageCache).
+
+        Downloaded files are recorded in the `manifest` (see:
+        DownloadManifest), so unchanged files are not downloaded again.
+
+        Responses are cached in the `cache` (see: ResponseCache). Cached
+        responses are returned without any delay and have attribute
+        `from_cache` set to True.
+
+        Request latencies, response status codes and received bytes are
+        recorded to `metrics` if it's given (see: Metrics). Crawler sets it to
+        its own metrics.
+
+        Number of concurrent requests is limited by `limiter` if it's given
+        (see: AdaptiveLimit).
+
+        See: requests.adapters.HTTPAdapter
         """
         self.working_dir = working_dir
-        self.session = requests.Session()
-        self.session.headers = {'User-Agent': self.USER_AGENT}
+        self.headers = {'User-Agent': self.USER_AGENT}
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
         if headers:
-            self.session.headers.update(headers)
-        if cookies:
-            self.session.cookies = cookies
+            self.headers.update(headers)
+        self.cookies = cookies
         self.requests_delay = requests_delay
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.parser = parser
+        self.lazy = lazy
+        self.page_cache = page_cache
+        self.manifest = manifest
+        self.cache = cache
+        self.metrics = metrics
+        self.limiter = limiter
+        self._interrupted = threading.Event()
+        self._local = threading.local()
+        self._session = None if thread_sessions else self._new_session()
+
+    @property
+    def session(self):
+        """
+        Session used to do requests. If client was created with
+        `thread_sessions`, then every thread has its own session.
+        """
+        if self._session is not None:
+            return self._session
+        try:
+            return self._local.session
+        except AttributeError:
+            self._local.session = self._new_session()
+            return self._local.session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers = self.headers
+        if self.cookies is None:
+            self.cookies = session.cookies
+        session.cookies = self.cookies
+        self._mount_adapters(session)
+        return session
+
+    def _mount_adapters(self, session):
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.max_retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    def configure_pool(self, pool_connections=None, pool_maxsize=None,
+                       max_retries=None, keep_alive=None,
+                       thread_sessions=None):
+        """
+        Change options of the connection pooling given in the constructor,
+        options which are None are kept. Sessions are created again with the
+        new options.
+        """
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+        if max_retries is not None:
+            self.max_retries = max_retries
+        if keep_alive is not None:
+            if keep_alive:
+                self.headers.pop('Connection', None)
+            else:
+                self.headers['Connection'] = 'close'
+        if thread_sessions is None:
+            thread_sessions = self._session is None
+        self._local = threading.local()
+        if thread_sessions:
+            self._session = None
+        elif self._session is None:
+            self._session = self._new_session()
+        else:
+            self._mount_adapters(self._session)
+
+    def resize_pool(self, maxsize):
+        """
+        Enlarge connection pool of the shared session so it can keep at least
+        `maxsize` connections per host.
+        """
+        if maxsize > self.pool_maxsize:
+            self.pool_maxsize = maxsize
+            if self._session is not None:
+                self._mount_adapters(self._session)
 
     def file(self, *filename, mkdir=False):
         """
@@ -63,15 +200,76 @@ class Client:
 
         Request are delayed when argument `delay` or `self.requests_delay` is
         greater than zero. Delay time equals `max(delay, self.requests_delay)`
-        seconds.
+        seconds. Delay is cancelled by interrupt(), then InterruptedError is
+        raised.
 
-        See: requests.request(), request_delay()
+        See: requests.request(), send()
         """
+        response = self.cached(method, url, **kwargs)
+        if response is not None:
+            return response
         delay = max(self.requests_delay, delay)
         if delay > 0:
             logger.debug('Request delay %.1f seconds', delay)
-            time.sleep(delay)
-        return self.session.request(method, url, **kwargs)
+            if self._interrupted.wait(delay):
+                raise InterruptedError('request was interrupted')
+        return self.send(method, url, **kwargs)
+
+    def interrupt(self):
+        """
+        Interrupt delays of current and all following requests, eg. when the
+        crawler is stopped.
+        """
+        self._interrupted.set()
+
+    def clear_interrupt(self):
+        """Cancel interrupt(), following requests are delayed again."""
+        self._interrupted.clear()
+
+    def send(self, method, url, **kwargs):
+        """
+        Do a HTTP request as same as request(), but without any delay and
+        cache lookup. Response is stored to the cache.
+
+        See: request()
+        """
+        start = self.limiter.acquire() if self.limiter is not None else None
+        try:
+            if self.metrics is None:
+                response = self.session.request(method, url, **kwargs)
+            else:
+                response = self._send_measured(method, url, **kwargs)
+        except Exception as e:
+            if start is not None:
+                self.limiter.release(start, error=e)
+            raise
+        if start is not None:
+            self.limiter.release(start, response)
+        if self.cache is not None:
+            self.cache.put(method, url, kwargs, response)
+        return response
+
+    def _send_measured(self, method, url, **kwargs):
+        host = utils.url_host(url)
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self.metrics.inc('request_errors_total', host=host)
+            raise
+        finally:
+            self.metrics.observe('request_seconds', time.monotonic() - start,
+                                 host=host)
+        self.metrics.inc('requests_total', host=host,
+                         status=response.status_code)
+        if not kwargs.get('stream'):
+            self.metrics.inc('received_bytes_total', len(response.content))
+        return response
+
+    def cached(self, method, url, **kwargs):
+        """Returns cached response of the request or None."""
+        if self.cache is not None:
+            return self.cache.get(method, url, kwargs)
 
     def get(self, url, **kwargs):
         """Shortcut for request('GET', ...)."""
@@ -81,7 +279,8 @@ class Client:
         """Shortcut for request('POST', ...)."""
         return self.request('POST', url, **kwargs)
 
-    def request_page(self, method, url, **kwargs):
+    def request_page(self, method, url, parser=None, parse_only=None,
+                     lazy=None, **kwargs):
         """
         Shortcut to do a HTTP request and parse text response.
 
@@ -89,37 +288,335 @@ class Client:
         (response.ok is False) then tuple of response and None (instead of
         parsed page) is returned.
 
+        Arguments `parser`, `parse_only` and `lazy` overrides client settings
+        for this request, see: parse().
+
         See: request()
         """
         response = self.request(method, url, **kwargs)
         if response.ok:
-            return response, bs4.BeautifulSoup(response.text, 'html5lib')
+            return response, self.parse(response, parser, parse_only, lazy)
         return response, None
 
+    def parse(self, response, parser=None, parse_only=None, lazy=None):
+        """
+        Parse text of the response by `parser` or parser of the client. If
+        `lazy` (or lazy of the client) is True, then LazyPage is returned.
+
+        See: parsing.parse()
+        """
+        parser = parser or self.parser
+        if self.lazy if lazy is None else lazy:
+            return parsing.LazyPage(response.text, parser, parse_only,
+                                    self.page_cache)
+        if self.page_cache is not None:
+            return self.page_cache.parse(response.text, parser, parse_only)
+        return parsing.parse(response.text, parser, parse_only)
+
     def get_page(self, url, **kwargs):
         """Shortcut for request_page('GET', ...)."""
         return self.request_page('GET', url, **kwargs)
 
-    def download(self, url, filename=None, method='GET', **kwargs):
+    def links(self, url, selector=parsing.LinkExtractor.SELECTOR,
+              pattern=None, method='GET', chunk_size=None, **kwargs):
+        """
+        Do a HTTP request and iterate absolute normalized links of the HTML
+        response while it's received, so the page is never held in memory
+        nor parsed to a document. Handler can return them directly, eg.
+        `return client.links(url, pattern=r'/item/')`.
+
+        Request is done when the iteration starts. Unsuccessful response
+        raises requests.HTTPError. Response is streamed, so it's not cached.
+
+        See: extract_links(), request()
+        """
+        response = self.request(method, url, stream=True, **kwargs)
+        with response:
+            response.raise_for_status()
+            chunks = response.iter_content(
+                chunk_size or self.LINKS_CHUNK_SIZE)
+            if self.metrics is not None:
+                chunks = self._count_received(chunks)
+            yield from parsing.extract_links(
+                chunks, response.url, _html_encoding(response),
+                selector=selector, pattern=pattern)
+
+    def extract_links(self, response, selector=parsing.LinkExtractor.SELECTOR,
+                      pattern=None, chunk_size=None):
+        """
+        Iterate links of the HTML `response` read in chunks of `chunk_size`
+        bytes (defaults to LINKS_CHUNK_SIZE). Links are taken from
+        attributes given by `selector` (eg. 'a[href], img[src]') and only
+        those searched by regular expression `pattern` are returned.
+
+        See: parsing.LinkExtractor, parsing.extract_links()
+        """
+        return parsing.extract_links(
+            response.iter_content(chunk_size or self.LINKS_CHUNK_SIZE),
+            response.url, _html_encoding(response), selector=selector,
+            pattern=pattern)
+
+    def _count_received(self, chunks):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.metrics.inc('received_bytes_total', size)
+
+    def download(self, url, filename=None, method='GET', chunk_size=None,
+                 resume=True, preallocate=False, **kwargs):
         """
         Download file and returns its filename and size. If `filename` is None,
         then file name will be extracted from URL.
 
+        File is downloaded to the temporary file with '.part' suffix, which is
+        renamed when download is complete, so incomplete file is never left
+        under the `filename`. Unsuccessful response raises requests.HTTPError.
+
+        If `resume` is True and the temporary file exists (previous download
+        failed), then download continues from its end by HTTP Range request.
+        ETag and Last-Modified of the file are saved next to the temporary
+        file (with '.validators' suffix) and the range is requested with
+        If-Range, so parts of different versions of the file are never mixed.
+        If server doesn't support ranges, the file has changed or it has no
+        validators, then whole file is downloaded again.
+
+        Response is written in chunks of `chunk_size` bytes (defaults to
+        DOWNLOAD_CHUNK_SIZE). If `preallocate` is True, then disk space is
+        allocated from Content-Length before writing.
+
+        If the client has manifest and the file was already downloaded, then
+        it's requested conditionally by its ETag or Last-Modified, and it's
+        not downloaded again if server responds 304 Not Modified. File which
+        has no validators is not requested at all.
+
         See: request()
         """
-        size = 0
         if not filename:
             filename = utils.url_filename(url)
-        with open(self.file(filename), 'wb') as f:
-            response = self.request(method, url, stream=True, **kwargs)
-            for chunk in response.iter_content(chunk_size=4096):
-                size += len(chunk)
-                if chunk:
-                    f.write(chunk)
+        filepath = self.file(filename)
+        partpath = filepath + '.part'
+        validatorspath = partpath + '.validators'
+        offset = 0
+        entry = None
+        etag = last_modified = None
+        if resume and os.path.exists(partpath):
+            etag, last_modified = _read_validators(validatorspath)
+            if_range = etag if etag and not etag.startswith('W/') \
+                else last_modified
+            if if_range:
+                offset = os.path.getsize(partpath)
+        headers = dict(kwargs.pop('headers', None) or {})
+        request_headers = dict(headers)
+        if offset:
+            request_headers['Range'] = 'bytes={}-'.format(offset)
+            request_headers['If-Range'] = if_range
+        else:
+            entry = self._manifest_entry(url, filename)
+            if entry:
+                if not entry.etag and not entry.last_modified:
+                    logger.debug('%s already downloaded', repr(url))
+                    return filename, entry.size
+                if entry.etag:
+                    request_headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    request_headers['If-Modified-Since'] = entry.last_modified
+        response = self.request(method, url, stream=True,
+                                headers=request_headers, **kwargs)
+        with response:
+            # Temporary file can be complete if it wasn't renamed.
+            complete = bool(offset) and response.status_code == 416 and \
+                _range_length(response) == offset
+            if offset and response.status_code == 416 and not complete:
+                logger.debug('%s can not be resumed', repr(url))
+                os.remove(partpath)
+                return self.download(url, filename, method, chunk_size,
+                                     False, preallocate, headers=headers,
+                                     **kwargs)
+            if not complete:
+                response.raise_for_status()
+            if response.status_code == 304:
+                logger.debug('%s not modified', repr(url))
+                return filename, entry.size
+            if offset and not complete and \
+                    not _range_start(response) == offset:
+                logger.debug('%s can not be resumed', repr(url))
+                offset = 0
+            if not offset:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                _write_validators(validatorspath, etag, last_modified)
+            sha256 = hashlib.sha256()
+            with open(partpath, 'r+b' if offset else 'wb') as f:
+                if offset and self.manifest is not None:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        sha256.update(chunk)
+                f.seek(offset)
+                if not complete:
+                    length = response.headers.get('Content-Length')
+                    if preallocate and length and \
+                            hasattr(os, 'posix_fallocate'):
+                        os.posix_fallocate(f.fileno(), offset, int(length))
+                    for chunk in response.iter_content(
+                            chunk_size or self.DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        sha256.update(chunk)
+                    # Remove preallocated space if the response was shorter.
+                    f.truncate()
+                size = f.tell()
+        if self.metrics is not None:
+            self.metrics.inc('received_bytes_total', size - offset)
+        os.replace(partpath, filepath)
+        os.remove(validatorspath)
+        if self.manifest is not None:
+            self.manifest.put(url, filename, size, etag, last_modified,
+                              sha256.hexdigest())
         logger.debug('%s downloaded to %s, size %d KiB',
                      repr(url), repr(filename), size / 1024)
         return filename, size
 
+    def _manifest_entry(self, url, filename):
+        """
+        Returns manifest entry of the URL if the file was downloaded and it
+        was not changed since then, otherwise None.
+        """
+        if self.manifest is None:
+            return None
+        entry = self.manifest.get(url)
+        if entry and entry.filename == filename:
+            try:
+                if os.path.getsize(self.file(filename)) == entry.size:
+                    return entry
+            except OSError:
+                pass
+        return None
+
+
+def _html_encoding(response):
+    """
+    Returns encoding from Content-Type of the response or None, default
+    encoding of requests (ISO-8859-1) is not used for HTML.
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+    return None
+
+
+def _read_validators(path):
+    """
+    Returns tuple of ETag and Last-Modified saved by _write_validators(),
+    None if the value is missing.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            etag, _, last_modified = f.read().partition('\n')
+    except FileNotFoundError:
+        return None, None
+    return etag or None, last_modified or None
+
+
+def _write_validators(path, etag, last_modified):
+    """Save ETag and Last-Modified of the downloaded file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{}\n{}'.format(etag or '', last_modified or ''))
+
+
+def _range_length(response):
+    """Returns complete length of the unsatisfiable range response."""
+    match = re.match(r'bytes \*/(\d+)', response.headers.get(
+        'Content-Range', ''))
+    if match:
+        return int(match.group(1))
+
+
+def _range_start(response):
+    """Returns first byte position of the partial content response."""
+    if response.status_code == 206:
+        match = re.match(r'bytes (\d+)-', response.headers.get(
+            'Content-Range', ''))
+        if match:
+            return int(match.group(1))
+
+
+class CallPlan:
+    """
+    Precompiled description how to call a handler, so its signature doesn't
+    have to be inspected for every task.
+
+    Attributes:
+        args -- names of arguments which handler accepts
+        var_keyword -- True if handler accepts **kwargs
+        is_class -- True if handler is class and instance must be created
+            before call
+        is_async -- True if handler is coroutine or asynchronous generator
+            function
+    """
+
+    def __init__(self, func):
+        self.is_class = inspect.isclass(func)
+        call = func.__call__ if self.is_class else func
+        self.is_async = (inspect.iscoroutinefunction(call) or
+                         inspect.isasyncgenfunction(call))
+        signature = inspect.signature(call)
+        params = signature.parameters.values()
+        self.args = frozenset(param.name for param in params
+                              if param.kind == param.POSITIONAL_OR_KEYWORD)
+        self.var_keyword = any(param.kind == param.VAR_KEYWORD
+                               for param in params)
+
+    @classmethod
+    def of(cls, func):
+        """
+        Returns CallPlan for the given callable. Plans are cached, bound
+        methods share plan of their function and functions share plan of
+        their code, so closures created for every task don't need a new one.
+        Cache doesn't keep callables alive.
+        """
+        try:
+            return _call_plan(getattr(func, '__func__', func))
+        except TypeError:
+            # Unhashable callable.
+            return cls(func)
+
+    def __call__(self, func, args):
+        """Call `func` with those of `args` which it accepts."""
+        if self.is_class:
+            func = func()
+        if self.var_keyword:
+            return func(**args)
+        return func(**{k: v for k, v in args.items() if k in self.args})
+
+    def __repr__(self):
+        return '<{} {}{}>'.format(self.__class__.__name__,
+                                  sorted(self.args),
+                                  ' **kwargs' if self.var_keyword else '')
+
+
+# Plans of plain functions keyed by their code, code doesn't reference
+# closures or globals.
+_code_plans = {}
+_CODE_PLANS_MAXSIZE = 1024
+# Plans of other callables (classes, partials, wrapped functions).
+_call_plans = weakref.WeakKeyDictionary()
+
+
+def _call_plan(func):
+    if (type(func) is types.FunctionType and
+            not hasattr(func, '__wrapped__') and
+            not hasattr(func, '__signature__')):
+        plans, key = _code_plans, func.__code__
+        if len(plans) >= _CODE_PLANS_MAXSIZE and key not in plans:
+            plans.clear()
+    else:
+        plans, key = _call_plans, func
+    try:
+        return plans[key]
+    except KeyError:
+        plan = plans[key] = CallPlan(func)
+        return plan
+
 
 class Task:
     """
@@ -146,37 +643,71 @@ class Task:
             see: Handler.groups()
     """
 
-    def __init__(self, url, data={}, handler=None, priority=0):
+    __slots__ = ('url', '_data', 'handler', 'priority', 'match', '_seq',
+                 'attempt', 'depth')
+
+    def __init__(self, url, data=None, handler=None, priority=0):
         self.url = url
-        self.data = data
+        # Empty data are not stored, see: data
+        self._data = data or None
         self.handler = handler
         self.priority = priority
+        # Match of the handler pattern, set when the handler is routed.
+        self.match = None
+        # Order of addition to the queue, set by queue.
+        self._seq = 0
+        # Number of retries, see: RetryPolicy
+        self.attempt = 0
+        # Number of tasks from the starter task, set by crawler to tasks
+        # returned by handler, see: DepthFilter
+        self.depth = 0
+
+    @property
+    def data(self):
+        """Task data dict, it's created on the first access."""
+        if self._data is None:
+            self._data = {}
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
 
     def process(self, client, **kwargs):
         """Execute task if handler is not None."""
         if self.handler:
             args = {'client': client, 'url': self.url, 'data': self.data}
             if isinstance(self.handler, Handler):
-                args['groups'] = self.handler.groups(self.url)
-            else:
-                args['groups'] = None
+                args['groups'] = self.handler.groups(self.url, self.match)
+                args.update(kwargs)
+                return self.handler.call(args)
+            args['groups'] = None
             args.update(kwargs)
-            if self._handler_is_var_keyword():
-                return self.handler(**args)
-            # Pass only args which handler can accept.
-            return self.handler(**{k: v for k, v in args.items()
-                                   if k in self._handler_args()})
+            return self.call_plan(self.handler, args)
+
+    @property
+    def call_plan(self):
+        """CallPlan of the handler."""
+        if isinstance(self.handler, Handler):
+            return self.handler.call_plan
+        return CallPlan.of(self.handler)
 
     def _handler_is_var_keyword(self):
         """Check if handler accepts **kwargs or not."""
-        return any(param.kind == param.VAR_KEYWORD
-                   for param in self.handler_signature.parameters.values())
+        return self.call_plan.var_keyword
 
     def _handler_args(self):
         """Returns list of handler's argument names."""
-        return set(param.name
-                   for param in self.handler_signature.parameters.values()
-                   if param.kind == param.POSITIONAL_OR_KEYWORD)
+        return self.call_plan.args
+
+    @property
+    def handler_name(self):
+        """Qualified name of the handler function, used in metrics."""
+        if isinstance(self.handler, Handler):
+            handler = self.handler.func
+        else:
+            handler = self.handler
+        return getattr(handler, '__qualname__', repr(handler))
 
     @property
     def handler_signature(self):
@@ -189,7 +720,11 @@ class Task:
         return inspect.signature(handler)
 
     def __lt__(self, other):
-        return self.priority > other.priority
+        # Tasks with the same priority are ordered by their addition to the
+        # queue, so tasks can be stored in the heap directly without tuples.
+        if self.priority != other.priority:
+            return self.priority > other.priority
+        return self._seq < other._seq
 
     def __repr__(self):
         return '<{} {}>'.format(self.__class__.__name__, repr(self.url))
@@ -203,6 +738,8 @@ class Stop(Task):
     all other tasks.
     """
 
+    __slots__ = ()
+
     def __init__(self, priority=-9999):
         super().__init__(None, priority=priority)
 
@@ -218,34 +755,246 @@ class Abort(Stop):
     By default it has highest reasonable priority, so crawling is stopped ASAP.
     """
 
+    __slots__ = ()
+
     def __init__(self, priority=9999):
         super().__init__(priority)
 
 
-class TaskQueue(queue.PriorityQueue):
+class AbortableQueue(queue.Queue):
+    """
+    Queue which can be aborted, then waiting and all following get() calls
+    return Abort task immediately, even if tasks are queued.
+
+    Limit `maxsize` of the bounded queue is soft. Blocking put (eg. of the
+    starter) waits until there is a free slot, but non-blocking put (eg. of
+    tasks returned by handlers) exceeds the limit instead of raising
+    queue.Full, so no task is lost.
+    """
+
+    aborted = False
+
+    def put(self, task, block=True, timeout=None):
+        """See: queue.Queue.put()"""
+        if block or self.maxsize <= 0:
+            super().put(task, block, timeout)
+        else:
+            with self.not_full:
+                self._put(task)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+
+    def abort(self):
+        """Abort the queue and wake up all waiting threads."""
+        with self.mutex:
+            self.aborted = True
+            self.not_empty.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """See: queue.Queue.get()"""
+        with self.not_empty:
+            if not block:
+                if not self._qsize() and not self.aborted:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._qsize() and not self.aborted:
+                    self.not_empty.wait()
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            else:
+                endtime = time.monotonic() + timeout
+                while not self._qsize() and not self.aborted:
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            if self.aborted:
+                return Abort()
+            task = self._get()
+            self.not_full.notify()
+            return task
+
+    def put_many(self, tasks):
+        """
+        Put all `tasks` without blocking, as put(task, False) of every task,
+        but the lock is acquired only once.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return
+        with self.not_empty:
+            self._put_many(tasks)
+            self.unfinished_tasks += len(tasks)
+            self.not_empty.notify(len(tasks))
+
+    def _put_many(self, tasks):
+        for task in tasks:
+            self._put(task)
+
+    def tasks(self):
+        """Returns list of queued tasks."""
+        with self.mutex:
+            return list(self.queue)
+
+
+class TaskQueue(AbortableQueue, queue.PriorityQueue):
     """
     Priority queue for tasks, which guarantees that two tasks with the same
     priority are returned in the order they were added
 
+    If `maxsize` is greater than 0, then the queue is bounded. Blocking put
+    waits until there is a free slot. Non-blocking put moves tasks over the
+    limit to the `spill` store (see: TaskStore), they are moved back when
+    queue is half empty. Without spill store, non-blocking put exceeds the
+    limit, as well as tasks which can't be stored (see: TaskStore.storable).
+    Spilled tasks are counted to `metrics` if it's given.
+
     https://docs.python.org/3/library/heapq.html#priority-queue-implementation-notes
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._lock = threading.Lock()
-        self._counter = 0
+    def __init__(self, maxsize=0, spill=None):
+        super().__init__(maxsize)
+        self.spill = spill
+        self.metrics = None
+        self._spilled = 0
+        self._counter = itertools.count()
+
+    def put(self, task, block=True, timeout=None):
+        # Tasks are ordered by their priority and sequence number.
+        task._seq = next(self._counter)
+        if block or self.maxsize <= 0:
+            super().put(task, block, timeout)
+        else:
+            with self.not_full:
+                spilled = self._put_or_spill(task)
+                self.not_empty.notify()
+                self.unfinished_tasks += 1
+            self._count_spilled(spilled)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Qin: %s Qlen=%d', task, self.qsize())
+
+    def _put_or_spill(self, task):
+        """
+        Put task to the heap, or to the spill store if queue is full. Returns
+        True if task was spilled.
+        """
+        full = self._spilled or self._qsize() >= self.maxsize
+        # Tasks which would lose their handler (and Stop) are kept in memory.
+        if full and self.spill is not None and self.spill.storable(task):
+            self.spill.add(task._seq, task)
+            self._spilled += 1
+            return True
+        self._put(task)
+        return False
+
+    def _count_spilled(self, count):
+        # Metrics are recorded without the queue lock, gauge of the queue
+        # depth takes it while the lock of metrics is held.
+        if count and self.metrics is not None:
+            self.metrics.inc('tasks_spilled_total', count)
+
+    def put_many(self, tasks):
+        """
+        Put all `tasks` without blocking, as put(task, False) of every task,
+        but the lock is acquired only once and large batches are added to the
+        heap by a single heapify.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return
+        for task in tasks:
+            task._seq = next(self._counter)
+        spilled = 0
+        with self.not_empty:
+            if self.maxsize > 0:
+                for task in tasks:
+                    spilled += self._put_or_spill(task)
+            else:
+                self._put_many(tasks)
+            self.unfinished_tasks += len(tasks)
+            self.not_empty.notify(len(tasks))
+        self._count_spilled(spilled)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Qin: %d tasks Qlen=%d', len(tasks), self.qsize())
+
+    def _put_many(self, tasks):
+        # Heapify is linear in the size of the whole heap, pushing is
+        # cheaper for batches smaller than the heap.
+        if len(tasks) < len(self.queue):
+            for task in tasks:
+                heapq.heappush(self.queue, task)
+        else:
+            self.queue.extend(tasks)
+            heapq.heapify(self.queue)
+
+    def _get(self):
+        task = super()._get()
+        if self._spilled and self._qsize() <= self.maxsize // 2:
+            for seq, spilled in self.spill.pop(self.maxsize - self._qsize()):
+                spilled._seq = seq
+                super()._put(spilled)
+                self._spilled -= 1
+        return task
+
+    def get(self, block=True, timeout=None):
+        task = super().get(block, timeout)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Qout: %s Qlen=%d', task, self.qsize())
+        return task
+
+    def tasks(self):
+        """Returns list of queued tasks, including spilled ones."""
+        with self.mutex:
+            tasks = list(self.queue)
+            if self._spilled:
+                tasks.extend(task for _, task in self.spill.tasks(
+                    self.spill.handler_list))
+            return tasks
+
+
+class LevelQueue(AbortableQueue):
+    """
+    Task queue with a FIFO deque for every priority level, it can be used
+    instead of the TaskQueue (`crawler.queue = LevelQueue()`).
+
+    Tasks usually have only a few distinct priorities, so put and get are
+    O(1) for already used priorities, instead of O(log n) heap operations.
+    Tasks with the same priority are returned in the order they were added.
+    """
+
+    def _init(self, maxsize):
+        # Priority -> deque of tasks, only non-empty levels are kept.
+        self.levels = {}
+        # Ascending priorities of levels, the highest one is the last.
+        self._priorities = []
+        self._size = 0
 
-    def put(self, task):
-        with self._lock:
-            super().put((-task.priority, self._counter, task))
-            self._counter += 1
-            logger.info('Qin: %s Qlen=%d', task, self.qsize())
+    def _qsize(self):
+        return self._size
 
-    def get(self):
-        task = super().get()[-1]
-        logger.info('Qout: %s Qlen=%d', task, self.qsize())
+    def _put(self, task):
+        try:
+            self.levels[task.priority].append(task)
+        except KeyError:
+            self.levels[task.priority] = collections.deque((task,))
+            bisect.insort(self._priorities, task.priority)
+        self._size += 1
+
+    def _get(self):
+        priority = self._priorities[-1]
+        level = self.levels[priority]
+        task = level.popleft()
+        if not level:
+            del self.levels[priority]
+            self._priorities.pop()
+        self._size -= 1
         return task
 
+    def tasks(self):
+        with self.mutex:
+            return [task for priority in reversed(self._priorities)
+                    for task in self.levels[priority]]
+
 
 class Handler:
     """
@@ -257,12 +1006,35 @@ class Handler:
 
     Given `func` can be function or callable class. Class instance will be
     created before call.
+
+    If `delay` is greater than 0, then task of this handler is not processed
+    sooner than `delay` seconds after the previous request to the same host.
+    Delay is respected only by scheduling queues, see: HostQueue.
+
+    Failed tasks are retried by the `retry` policy (see: RetryPolicy), or by
+    policy of the crawler if it's None.
     """
 
-    def __init__(self, func, pattern, flags=0, priority=0):
+    def __init__(self, func, pattern, flags=0, priority=0, delay=0,
+                 retry=None):
         self.func = func
         self.pattern = re.compile(pattern, flags)
         self.priority = priority
+        self.delay = delay
+        self.retry = retry
+        self.call_plan = CallPlan(func)
+        # Literal which must be in every matching URL, it is checked before
+        # the pattern is searched to quickly skip non-matching handlers.
+        self.literal = _pattern_literal(self.pattern)
+
+    def search(self, url):
+        """
+        Search the pattern in the given URL. Returns match object or None.
+
+        See: re.search()
+        """
+        if self.literal in url:
+            return self.pattern.search(url)
 
     def match(self, url):
         """
@@ -270,21 +1042,33 @@ class Handler:
 
         See: re.search()
         """
-        return bool(self.pattern.search(url))
+        return bool(self.search(url))
 
-    def groups(self, url):
+    def groups(self, url, match=None):
         """
         Returns all (including named) match groups in the given URL. Returns
         dict of groups if match was found, otherwise None.
+
+        If `match` object of this handler pattern is given, then the pattern
+        is not searched again.
         """
-        match = self.pattern.search(url)
+        if match is None:
+            match = self.search(url)
         if match:
             return utils.merge_dicts({0: match.group(0)},
                                      dict(enumerate(match.groups(), 1)),
                                      match.groupdict())
 
+    def call(self, args):
+        """
+        Call handler with those of `args` dict which it accepts.
+
+        See: CallPlan
+        """
+        return self.call_plan(self.func, args)
+
     def __call__(self, *args, **kwargs):
-        if inspect.isclass(self.func):
+        if self.call_plan.is_class:
             return self.func()(*args, **kwargs)
         return self.func(*args, **kwargs)
 
@@ -297,6 +1081,125 @@ class Handler:
                                    repr(self.pattern.pattern))
 
 
+class ParseHandler(Handler):
+    """
+    Handler which splits task processing into the request, which is done in
+    the crawler thread, and parsing of the response by `func`, which is done
+    in the `executor` (eg. ProcessPoolExecutor). So CPU heavy parsing is not
+    limited by GIL.
+
+    Request is done by HTTP `method`, response which is not successful raises
+    requests.HTTPError. Function `func` must be picklable (defined at the
+    module level), it can accept arguments `url`, `data`, `groups`, `body`
+    (response content as bytes) and `encoding` (response encoding), all of
+    them must be picklable too. Next tasks are returned as from any other
+    handler.
+    """
+
+    def __init__(self, func, pattern, flags=0, priority=0, delay=0,
+                 retry=None, *, executor, method='GET'):
+        super().__init__(func, pattern, flags, priority, delay, retry)
+        self.executor = executor
+        self.method = method
+
+    def call(self, args):
+        response = args['client'].request(self.method, args['url'])
+        response.raise_for_status()
+        args = utils.merge_dicts(args, {'body': response.content,
+                                        'encoding': response.encoding})
+        # Client can't be passed to another process.
+        del args['client']
+        if not self.call_plan.var_keyword:
+            args = {k: v for k, v in args.items() if k in self.call_plan.args}
+        future = self.executor.submit(_call_parser, self.func,
+                                      self.call_plan.is_class, args)
+        # Thread waits without holding GIL, so other threads can do requests.
+        return future.result()
+
+
+def _call_parser(func, is_class, args):
+    if is_class:
+        func = func()
+    # Generators can't be returned from another process.
+    return list(func(**args) or [])
+
+
+_QUANTIFIER = re.compile(r'\{(?:\d+|\d*,\d*)\}')
+
+
+def _pattern_literal(regex):
+    """
+    Returns the longest literal string which must be contained in every string
+    matched by compiled `regex`. Only top level of the pattern is examined, so
+    empty string is returned if no such literal can be easily found.
+    """
+    pattern = regex.pattern
+    if not isinstance(pattern, str) or regex.flags & (re.I | re.X):
+        return ''
+    runs = ['']
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = None
+        c = pattern[i]
+        i += 1
+        if c == '\\':
+            escaped = pattern[i:i + 1]
+            i += 1
+            # Escaped punctuation is literal, otherwise it is special
+            # sequence (\d, \b, \1, ...). Whole escape sequences of
+            # characters (\xhh, \uhhhh, \Uhhhhhhhh, \N{...}, octal) and
+            # backreferences are skipped, they only break the literal.
+            if escaped and not escaped.isalnum():
+                char = escaped
+            elif escaped in ('x', 'u', 'U'):
+                i += {'x': 2, 'u': 4, 'U': 8}[escaped]
+            elif escaped == 'N' and pattern[i:i + 1] == '{':
+                i = pattern.find('}', i) + 1 or len(pattern)
+            elif escaped.isdigit():
+                # Octal escape has up to 3 digits, backreference up to 2.
+                end = i + 2
+                while i < end and pattern[i:i + 1].isdigit():
+                    i += 1
+        elif c == '[':
+            # Skip character class, first ] is part of the class.
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+        elif c == '(':
+            if pattern[i:i + 1] == '?' and pattern[i + 1:i + 2] in 'aiLmsux-#':
+                # Inline flags can change meaning of whole pattern, comments
+                # could split the literal.
+                return ''
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|':
+            if depth == 0:
+                return ''
+        elif c in '*?{':
+            # Quantified character is optional.
+            if c == '{':
+                # Brace which doesn't start {m,n} is literal, it's not worth
+                # handling.
+                quantifier = _QUANTIFIER.match(pattern, i - 1)
+                if quantifier is None:
+                    return ''
+                i = quantifier.end()
+            runs[-1] = runs[-1][:-1]
+        elif c not in '.^$+':
+            char = c
+        if char is not None and depth == 0:
+            runs[-1] += char
+        else:
+            runs.append('')
+    return max(runs, key=len)
+
+
 class HandlerList:
     """
     Collection of handlers.
@@ -326,9 +1229,19 @@ class HandlerList:
 
         Handlers are iterated in order and first matching handler is returned.
         """
-        for handler in self:
-            if handler.match(url):
-                return handler
+        return self.route(url)[0]
+
+    def route(self, url):
+        """
+        Find handler which matches to given URL as same as find_match(), but
+        returns tuple of handler and its match object. If no handler was found
+        then returns tuple (None, None).
+        """
+        for handler in self.handlers:
+            match = handler.search(url)
+            if match:
+                return handler, match
+        return None, None
 
     def __iter__(self):
         return iter(self.handlers)
@@ -355,6 +1268,17 @@ class Crawler:
             return []  # next tasks to process
 
         crawler.start()
+
+    Failed tasks are retried by `crawler.retry` policy if it's set (see:
+    RetryPolicy), retries are delayed in `crawler.delayed`.
+
+    Progress of the crawling is recorded to `crawler.metrics` (see:
+    Metrics). Tasks are logged only on DEBUG level, summaries of the progress
+    are logged periodically by `crawler.progress` if it's set, eg.
+    `crawler.progress = ProgressReporter(crawler.metrics)`.
+
+    Crawling can be stopped by stop() or by KeyboardInterrupt, tasks which
+    were not processed are passed to `crawler.on_stop` function.
     """
 
     def __init__(self, starter_fun=None):
@@ -362,86 +1286,403 @@ class Crawler:
         self.queue_filter_chain = utils.FilterChain()
         self.client = Client()
         self.queue = TaskQueue()
+        self.metrics = metrics.Metrics()
+        self.progress = None
+        self.retry = None
+        self.delayed = scheduler.DelayedTasks(self._push_delayed)
+        # Called with list of remaining tasks when crawling is stopped.
+        self.on_stop = None
+        # Number of tasks of the starter list pushed at once to unbounded
+        # queue.
+        self.starter_batch = 1000
+        # Seconds to wait for processed tasks on KeyboardInterrupt.
+        self.drain_timeout = None
+        # Seconds to wait for threads of the stopped crawling on restart.
+        self.restart_timeout = 60
+        self._deadline = None
+        # Created by the first parse_handler().
+        self.process_pool = None
+        self._own_process_pool = None
+        self._process_pool_closed = False
         self._stop_evt = threading.Event()
+        self._threads = []
         self.starter()(starter_fun or (lambda links: links))
 
     def __call__(self, *args, **kwargs):
         return self.start(*args, **kwargs)
 
-    def push_task(self, task):
+    def stop(self, timeout=None):
+        """
+        Stop the crawling as soon as possible, it can be called from any
+        thread or handler.
+
+        Waiting workers and request delays are woken up immediately. Tasks
+        being processed are finished, start() waits for them at most
+        `timeout` seconds (if it's not None). Queued and delayed tasks are
+        not processed, delayed tasks are returned to the queue (so persistent
+        queue keeps them) and all of them are passed to `on_stop` function.
+        """
+        if timeout is not None:
+            self._deadline = time.monotonic() + timeout
+        self._stop_evt.set()
+        self.client.interrupt()
+        if hasattr(self.queue, 'abort'):
+            self.queue.abort()
+
+    def _reset(self):
+        """Clear the stopped state of the previous crawling."""
+        # Workers which outlived the deadline of the stopped crawling must not
+        # take tasks of the next one. Waiting ones get Abort until the queue
+        # is reset.
+        deadline = time.monotonic() + self.restart_timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))
+        alive = sum(t.is_alive() for t in self._threads)
+        if alive:
+            raise RuntimeError(
+                '{} threads of the previous crawling are still running'
+                .format(alive))
+        self._stop_evt.clear()
+        self._deadline = None
+        self.client.clear_interrupt()
+        if getattr(self.queue, 'aborted', False):
+            self.queue.aborted = False
+        if hasattr(self.queue, 'all_tasks_done'):
+            # Workers of the previous crawling didn't mark their Stop as done.
+            with self.queue.all_tasks_done:
+                self.queue.unfinished_tasks = self.queue._qsize()
+
+    def push_task(self, task, block=False):
         """
         Add task to the queue. Task can be instance of Task class or list of
         tasks. Tasks are ordered by their priority or order of their addition.
+
+        If `block` is True and queue is bounded, then it waits until there is
+        a free slot in the queue.
         """
         if isinstance(task, list):
-            for t in task:
-                self.push_task(t)
-            return
-        if not isinstance(task, Task):
-            raise TypeError('task must be instance of Task')
-
-        if isinstance(task, Stop):
-            self.queue.put(task)
+            self.push_tasks(task, block)
         else:
+            self.push_tasks((task,), block)
+
+    def push_tasks(self, tasks, block=False):
+        """
+        Add all tasks from the iterable to the queue. Tasks are routed one by
+        one, filtered at once by filter() of the queue filter chain (see:
+        FilterChain) and accepted ones are added by put_many() of the queue
+        (if it has one), so the queue is locked only once for the whole
+        batch. Returns number of queued tasks.
+
+        See: push_task()
+        """
+        routed = []
+        stops = []
+        unhandled = 0
+        for task in tasks:
+            if not isinstance(task, Task):
+                raise TypeError('task must be instance of Task')
+            if isinstance(task, Stop):
+                stops.append(task)
+                continue
             if not task.handler:
-                task.handler = self.handler_list.find_match(task.url)
-            if not task.handler:
-                logger.info('%s empty handler', task)
-            elif self.queue_filter_chain(task):
-                self.queue.put(task)
+                task.handler, task.match = \
+                    self.handler_list.route(task.url)
+            if task.handler:
+                routed.append(task)
             else:
-                logger.info('%s filtered out', task)
+                logger.debug('%s empty handler', task)
+                unhandled += 1
+        batch = self._filter_tasks(routed) if routed else routed
+        enqueued = len(batch)
+        batch += stops
+        if block or len(batch) == 1 or not hasattr(self.queue, 'put_many'):
+            for task in batch:
+                self.queue.put(task, block)
+        elif batch:
+            self.queue.put_many(batch)
+        if enqueued:
+            self.metrics.inc('tasks_enqueued_total', enqueued)
+        if len(routed) > enqueued:
+            self.metrics.inc('tasks_filtered_total', len(routed) - enqueued)
+        if unhandled:
+            self.metrics.inc('tasks_unhandled_total', unhandled)
+        return enqueued
+
+    def _filter_tasks(self, tasks):
+        """Returns list of tasks which passed the queue filters."""
+        chain = self.queue_filter_chain
+        if hasattr(chain, 'filter'):
+            passed = chain.filter(tasks)
+        else:
+            passed = [task for task in tasks if chain(task)]
+        if logger.isEnabledFor(logging.DEBUG) and len(passed) < len(tasks):
+            passed_ids = set(map(id, passed))
+            for task in tasks:
+                if id(task) not in passed_ids:
+                    logger.debug('%s filtered out', task)
+        return passed
+
+    def _push_next_tasks(self, next_tasks, parent):
+        """
+        Push tasks returned by handler of the `parent` task, strings are
+        converted to Task. Depth of the tasks is one more than the parent's.
+        """
+        if next_tasks:
+            self.push_tasks(self._next_tasks(next_tasks, parent.depth + 1))
+
+    @staticmethod
+    def _next_tasks(next_tasks, depth):
+        for task in next_tasks:
+            if isinstance(task, str):
+                task = Task(task)
+            task.depth = depth
+            yield task
 
     def _worker(self):
         while True:
             task = self.queue.get()
-            if isinstance(task, Stop) or self._stop_evt.is_set():
+            if isinstance(task, Stop):
+                break
+            if self._stop_evt.is_set():
+                # Task got while stopping is kept for on_stop.
+                self.queue.put(task, False)
+                self.queue.task_done()
                 break
+            start = self._task_started()
             try:
-                next_tasks = task.process(self.client)
-                if next_tasks:
-                    for next_task in next_tasks:
-                        if isinstance(next_task, str):
-                            next_task = Task(next_task)
-                        self.push_task(next_task)
-                logger.info('%s finished', task)
+                self._push_next_tasks(task.process(self.client), task)
+                logger.debug('%s finished', task)
+                self._task_finished(task, start, 'finished')
             except Exception as e:
-                logger.info('%s failed', task)
-                logger.error(e, exc_info=True)
+                self._task_failed(task, start, e)
             self.queue.task_done()
 
-    def start(self, *args, count=1, **kwargs):
+    def _task_failed(self, task, start, error):
+        if self._retry(task, error):
+            self._task_finished(task, start, 'retried')
+        else:
+            logger.error('%s failed: %s', task, error, exc_info=error)
+            self._task_finished(task, start, 'failed')
+
+    def _retry(self, task, error):
+        """
+        Schedule retry of the failed task if it's allowed by retry policy.
+        Returns True if task will be retried.
+        """
+        policy = getattr(task.handler, 'retry', None) or self.retry
+        if isinstance(error, retry.Retry):
+            delay = error.delay
+            if delay is None:
+                delay = (policy or retry.RetryPolicy()).delay(
+                    task.attempt, error.__cause__)
+        elif policy is not None and task.attempt < policy.retries \
+                and policy.retryable(error):
+            delay = policy.delay(task.attempt, error)
+        else:
+            return False
+        task.attempt += 1
+        logger.debug('%s failed, retry in %.1f seconds', task, delay)
+        self._schedule_retry(task, delay)
+        return True
+
+    def _schedule_retry(self, task, delay):
+        # Persistent queue keeps the task until the retry is queued.
+        if hasattr(self.queue, 'defer'):
+            self.queue.defer(task)
+        self.delayed.add(task, delay)
+
+    def _push_delayed(self, task):
+        """Push task which was delayed, it's not filtered again."""
+        self.queue.put(task, False)
+        self.metrics.inc('tasks_enqueued_total')
+
+    def _wait_idle(self, threads):
+        """
+        Wait until all tasks (including delayed ones) are processed, until
+        some thread stops (eg. by Abort) or crawler is stopped.
+        """
+        while all(t.is_alive() for t in threads) \
+                and not self._stop_evt.is_set():
+            with self.queue.all_tasks_done:
+                # Delayed task is pushed before it's removed from the delayed
+                # tasks, so it's always counted in one of them.
+                if not self.queue.unfinished_tasks and not self.delayed:
+                    return
+                self.queue.all_tasks_done.wait(0.1)
+
+    def _task_started(self):
+        self.metrics.inc('tasks_dequeued_total')
+        self.metrics.add('workers_busy', 1)
+        return time.monotonic()
+
+    def _task_finished(self, task, start, status):
+        elapsed = time.monotonic() - start
+        handler = task.handler_name
+        self.metrics.add('workers_busy', -1)
+        self.metrics.inc('worker_busy_seconds_total', elapsed)
+        self.metrics.observe('handler_seconds', elapsed, handler=handler)
+        self.metrics.inc('tasks_total', handler=handler, status=status)
+
+    def _setup_metrics(self, count):
+        """Connect metrics to the queue and client."""
+        self.metrics.set('workers', count)
+        self.metrics.set('workers_busy', 0)
+        self.metrics.gauge_func('queue_depth', self.queue.qsize)
+        if getattr(self.queue, 'metrics', False) is None:
+            self.queue.metrics = self.metrics
+        if getattr(self.client, 'metrics', False) is None:
+            self.client.metrics = self.metrics
+        limiter = getattr(self.client, 'limiter', None)
+        if limiter is not None and limiter.metrics is None:
+            limiter.metrics = self.metrics
+            self.metrics.set('concurrency_limit', limiter.limit)
+
+    def start(self, *args, count=1, pool_maxsize=None, pool_connections=None,
+              max_retries=None, keep_alive=None, thread_sessions=None,
+              resume=False, **kwargs):
         """
         Start the crawling in given count of threads.
 
-        All arguments except `count` are passed to the starter function.
+        Connection pool of the client is enlarged to `pool_maxsize`
+        connections per host, by default to `count` so every thread can keep
+        its connection alive. Options `pool_connections`, `max_retries`,
+        `keep_alive` and `thread_sessions` of the client are changed if they
+        are given (see: Client.configure_pool()).
+
+        If `resume` is True, then pending tasks are restored from the
+        persistent queue (see: PersistentTaskQueue). Starter function is not
+        called if some tasks were restored.
+
+        All other arguments are passed to the starter function.
         Default starter function accepts only one argument `links` with list of
         urls to initialize the queue.
 
         This function blocks until all tasks from starter and handlers will be
-        processed.
+        processed, including retries of failed tasks. Crawler can be started
+        again when it's finished or stopped, threads which outlived the stop
+        deadline are waited for first, RuntimeError is raised if they don't
+        finish in `crawler.restart_timeout` seconds.
         """
-        threads = [threading.Thread(target=self._worker) for _ in range(count)]
+        self._reset()
+        self._open_process_pool()
+        self._configure_client(pool_maxsize or count, pool_connections,
+                               max_retries, keep_alive, thread_sessions)
+        self._setup_metrics(count)
+        if getattr(self.queue, 'spill', None) is not None:
+            self.queue.spill.handler_list = self.handler_list
+        restored = 0
+        if resume:
+            if not hasattr(self.queue, 'restore'):
+                raise TypeError('queue is not persistent')
+            restored = self.queue.restore(self.handler_list)
+        threads = self._threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(count)]
+        if self.progress is not None:
+            self.progress.start()
         try:
             for t in threads:
                 t.start()
-            for task in self.starter_fun(*args, **kwargs):
-                if isinstance(task, str):
-                    # Default priority is 0. Tasks from starter should have
-                    # lower priority than implicit (str) tasks from task
-                    # handlers.
-                    task = Task(task, priority=-1)
-                self.push_task(task)
-            for t in threads:
-                self.queue.put(Stop())
-                t.join()
+            if not restored:
+                self._push_starter_tasks(self.starter_fun(*args, **kwargs))
+            self._wait_idle(threads)
+            if not self._stop_evt.is_set():
+                for t in threads:
+                    self.queue.put(Stop())
+            self._join(threads)
         except KeyboardInterrupt as e:
-            self._stop_evt.set()
             logger.info('Stop request received, waiting for threads...')
-            for t in threads:
-                if t.is_alive():
-                    t.join()
+            self.stop(self.drain_timeout)
+            self._join(threads)
             raise e
+        finally:
+            self.delayed.close()
+            if self._stop_evt.is_set():
+                self._stopped()
+            if self.progress is not None:
+                self.progress.stop()
+            if hasattr(self.queue, 'flush'):
+                self.queue.flush()
+            self._close_process_pool()
+
+    def _configure_client(self, pool_maxsize, pool_connections=None,
+                          max_retries=None, keep_alive=None,
+                          thread_sessions=None):
+        options = (pool_connections, max_retries, keep_alive, thread_sessions)
+        if any(option is not None for option in options):
+            self.client.configure_pool(
+                pool_connections=pool_connections, max_retries=max_retries,
+                keep_alive=keep_alive, thread_sessions=thread_sessions)
+        self.client.resize_pool(pool_maxsize)
+
+    def _join(self, threads):
+        """Join threads, until the deadline if crawler is stopped."""
+        for t in threads:
+            if self._deadline is None:
+                t.join()
+            else:
+                t.join(max(0, self._deadline - time.monotonic()))
+        alive = sum(t.is_alive() for t in threads)
+        if alive:
+            logger.warning('%d threads did not finish in time', alive)
+
+    def _stopped(self):
+        """Hand remaining tasks of the stopped crawling to on_stop."""
+        remaining = []
+        for task in self.delayed.clear():
+            try:
+                self.queue.put(task, False)
+            except queue.Full:
+                remaining.append(task)
+        if hasattr(self.queue, 'tasks'):
+            remaining.extend(task for task in self.queue.tasks()
+                             if not isinstance(task, Stop))
+        logger.info('Crawling stopped, %d tasks remaining', len(remaining))
+        if self.on_stop is not None:
+            self.on_stop(remaining)
+
+    def _starter_task(self, task):
+        if isinstance(task, str):
+            # Default priority is 0. Tasks from starter should have lower
+            # priority than implicit (str) tasks from task handlers.
+            task = Task(task, priority=-1)
+        return task
+
+    def _push_starter_task(self, task):
+        # Starter waits when queue is full, so it's iterated lazily.
+        self.push_task(self._starter_task(task), block=True)
+
+    def _starter_batches(self, tasks):
+        """
+        Iterate lists of `starter_batch` tasks of the starter. Tasks of
+        iterators (eg. generators) are not collected, next task can take a
+        long time, so they are in lists of one task.
+        """
+        size = self.starter_batch if hasattr(tasks, '__len__') else 1
+        tasks = iter(tasks)
+        while True:
+            batch = [self._starter_task(task)
+                     for task in itertools.islice(tasks, size)]
+            if not batch:
+                break
+            yield batch
+
+    def _push_starter_tasks(self, tasks):
+        """
+        Push tasks of the starter until crawler is stopped. Bounded queue is
+        filled task by task, unbounded one by batches of `starter_batch` if
+        starter returned a collection (eg. list).
+        """
+        if getattr(self.queue, 'maxsize', 0) > 0:
+            for task in tasks:
+                if self._stop_evt.is_set():
+                    break
+                self._push_starter_task(task)
+        else:
+            for batch in self._starter_batches(tasks):
+                if self._stop_evt.is_set():
+                    break
+                self.push_tasks(batch)
 
     def starter(self):
         """
@@ -473,6 +1714,50 @@ class Crawler:
             return func
         return decorator
 
+    def parse_handler(self, *args, **kwargs):
+        """
+        Decorator to register the handler function (or class) which parses
+        responses in the process pool. Arguments are the same as for the
+        ParseHandler, executor defaults to the process pool of the crawler.
+
+        Process pool is created by the first call, its size defaults to
+        number of CPUs. It can be set before registering handlers, eg.
+        `crawler.process_pool = ProcessPoolExecutor(4)`, then its owner has to
+        shut it down. Process pool created by the crawler is shut down when
+        start() returns and created again by the next start().
+        """
+        def decorator(func):
+            if self.process_pool is None:
+                self.process_pool = self._own_process_pool = \
+                    concurrent.futures.ProcessPoolExecutor()
+            kwargs.setdefault('executor', self.process_pool)
+            handler = ParseHandler(func, *args, **kwargs)
+            self.handler_list.append(handler)
+            return func
+        return decorator
+
+    def _open_process_pool(self):
+        """
+        Replace process pool of parse handlers which was shut down by the
+        previous crawling.
+        """
+        if not self._process_pool_closed:
+            return
+        old = self._own_process_pool
+        self.process_pool = self._own_process_pool = \
+            concurrent.futures.ProcessPoolExecutor()
+        for handler in self.handler_list:
+            if getattr(handler, 'executor', None) is old:
+                handler.executor = self.process_pool
+        self._process_pool_closed = False
+
+    def _close_process_pool(self):
+        """Shut down process pool created by parse_handler()."""
+        if self._own_process_pool is not None and \
+                self._own_process_pool is self.process_pool:
+            self.process_pool.shutdown()
+            self._process_pool_closed = True
+
     def queue_filter(self):
         """
         Decorator to register the filter function. Multiple filters are
@@ -0,0 +1,297 @@
+"""
+Built-in queue filters.
+
+Filters are registered to the Crawler.queue_filter_chain, eg::
+
+    crawler.queue_filter_chain.append(DuplicateFilter(BloomFilter(10**8)))
+
+Declarative filters (URLFilter subclasses) are combined by the FilterChain
+into one check, eg::
+
+    crawler.queue_filter_chain.extend([
+        SchemeFilter(), DomainFilter(['example.com']),
+        ExtensionFilter(['.jpg', '.pdf'], exclude=True), DepthFilter(3)])
+"""
+
+__all__ = ['DuplicateFilter', 'MemoryStore', 'BloomFilter', 'SqliteStore',
+           'URLFilter', 'SchemeFilter', 'DomainFilter', 'ExtensionFilter',
+           'RegexFilter', 'DepthFilter']
+
+import hashlib
+import math
+import posixpath
+import re
+import sqlite3
+import threading
+
+from . import utils
+
+
+class MemoryStore:
+    """Exact set of seen keys held in memory."""
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, key):
+        """Add key to the store, returns True if it was not there yet."""
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def close(self):
+        pass
+
+
+class BloomFilter:
+    """
+    Memory bounded probabilistic set of seen keys.
+
+    Filter is sized for `capacity` keys with false positive rate `error_rate`,
+    false positive means that new key is reported as seen and so its task is
+    filtered out. Keys are never reported as new twice.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) /
+                              math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing, see Kirsch and Mitzenmacher: Less Hashing, Same
+        # Performance.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """Add key to the filter, returns True if it was not there yet."""
+        new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                new = True
+        self.count += new
+        return new
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & 1 << (pos & 7)
+                   for pos in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """
+    On-disk set of seen keys in SQLite database `path`, so it survives
+    restarts and its size is not limited by memory.
+
+    Only hashes of the keys are stored. Inserts are committed in batches of
+    `batch_size`, uncommitted keys are committed by close().
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen '
+                         '(hash BLOB PRIMARY KEY) WITHOUT ROWID')
+        self._pending = 0
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def add(self, key):
+        """Add key to the store, returns True if it was not there yet."""
+        cursor = self._db.execute('INSERT OR IGNORE INTO seen VALUES (?)',
+                                  (self._hash(key),))
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.commit()
+        return cursor.rowcount == 1
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def __contains__(self, key):
+        return self._db.execute('SELECT 1 FROM seen WHERE hash = ?',
+                                (self._hash(key),)).fetchone() is not None
+
+    def __len__(self):
+        return self._db.execute('SELECT count(*) FROM seen').fetchone()[0]
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+class DuplicateFilter:
+    """
+    Filter out tasks whose URL was already queued.
+
+    URLs are normalized by `normalize` function before they are looked up in
+    the `store`, which is MemoryStore by default. URLs which can't be
+    normalized (normalize raises ValueError) are looked up as they are.
+    Filter can be used by multiple threads concurrently.
+
+    See: utils.url_normalize()
+    """
+
+    def __init__(self, store=None, normalize=utils.url_normalize):
+        self.store = store if store is not None else MemoryStore()
+        self.normalize = normalize
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        if self.normalize:
+            try:
+                return self.normalize(url)
+            except ValueError:
+                pass
+        return url
+
+    def __call__(self, task):
+        key = self._key(task.url)
+        with self._lock:
+            return self.store.add(key)
+
+    def filter(self, tasks):
+        """
+        Returns list of tasks with new URLs, the lock is acquired only once.
+        """
+        keys = [self._key(task.url) for task in tasks]
+        with self._lock:
+            add = self.store.add
+            return [task for task, key in zip(tasks, keys) if add(key)]
+
+    def close(self):
+        """Close the store."""
+        with self._lock:
+            self.store.close()
+
+
+class URLFilter:
+    """
+    Base class of declarative filters.
+
+    Declarative filter has no side effects, it only checks the task and its
+    URL split by utils.url_split(). So FilterChain can split the URL only
+    once for all of them and check them before other filters, ordered by
+    their `cost`.
+    """
+
+    cost = 1
+
+    def check_url(self, task, parts):
+        """Returns True if the task with URL `parts` passes the filter."""
+        raise NotImplementedError
+
+    def __call__(self, task):
+        return self.check_url(task, utils.url_split(task.url or ''))
+
+
+class SchemeFilter(URLFilter):
+    """Pass only tasks whose URL scheme is one of `schemes`."""
+
+    def __init__(self, schemes=('http', 'https')):
+        self.schemes = frozenset(s.lower() for s in schemes)
+
+    def check_url(self, task, parts):
+        return parts.scheme in self.schemes
+
+
+class DomainFilter(URLFilter):
+    """
+    Pass only tasks whose host is one of `domains` or their subdomain. If
+    `exclude` is True, then those tasks are filtered out instead.
+    """
+
+    cost = 2
+
+    def __init__(self, domains, exclude=False):
+        self.domains = frozenset(d.lower().strip('.') for d in domains)
+        self.exclude = exclude
+
+    def check_url(self, task, parts):
+        host = parts.hostname
+        while host:
+            if host in self.domains:
+                return not self.exclude
+            host = host.partition('.')[2]
+        return self.exclude
+
+
+class ExtensionFilter(URLFilter):
+    """
+    Pass only tasks whose URL path has one of file `extensions` (eg. '.html',
+    '' for paths without extension), case is ignored. If `exclude` is True,
+    then those tasks are filtered out instead.
+
+    See: utils.url_fileext()
+    """
+
+    cost = 2
+
+    def __init__(self, extensions, exclude=False):
+        self.extensions = frozenset(
+            e.lower() if not e or e.startswith('.') else '.' + e.lower()
+            for e in extensions)
+        self.exclude = exclude
+
+    def check_url(self, task, parts):
+        ext = posixpath.splitext(parts.path)[1].lower()
+        return (ext in self.extensions) != self.exclude
+
+
+class RegexFilter(URLFilter):
+    """
+    Pass only tasks whose URL is searched by one of regular expression
+    `patterns`. Patterns are compiled into one regular expression. If
+    `exclude` is True, then matching tasks are filtered out instead.
+    """
+
+    cost = 3
+
+    def __init__(self, patterns, exclude=False, flags=0):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.regex = re.compile('|'.join('(?:{})'.format(p)
+                                         for p in patterns), flags)
+        self.exclude = exclude
+
+    def check_url(self, task, parts):
+        return (self.regex.search(task.url or '') is None) == self.exclude
+
+
+class DepthFilter(URLFilter):
+    """
+    Pass only tasks which are at most `max_depth` tasks far from starter
+    tasks (see: Task.depth).
+    """
+
+    cost = 0
+
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+
+    def check_url(self, task, parts):
+        return task.depth <= self.max_depth
@@ -0,0 +1,61 @@
+"""
+Manifest of downloaded files, so reruns of the crawler don't download files
+which were not changed.
+"""
+
+__all__ = ['DownloadManifest']
+
+import collections
+import sqlite3
+import threading
+
+
+ManifestEntry = collections.namedtuple(
+    'ManifestEntry', 'url filename size etag last_modified sha256')
+
+
+class DownloadManifest:
+    """
+    SQLite database `path` of downloaded files. For every URL there is stored
+    file name, size, ETag, Last-Modified and SHA-256 hash of the content.
+
+    Manifest is used by Client.download(), it can be used by multiple threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS downloads '
+                         '(url TEXT PRIMARY KEY, filename TEXT, size INTEGER, '
+                         'etag TEXT, last_modified TEXT, sha256 TEXT)')
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns ManifestEntry of the URL or None."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM downloads WHERE url = ?',
+                                   (url,)).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def put(self, url, filename, size, etag=None, last_modified=None,
+            sha256=None):
+        """Add or replace the URL entry."""
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO downloads '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (url, filename, size, etag, last_modified,
+                              sha256))
+
+    def remove(self, url):
+        """Remove the URL entry."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM downloads WHERE url = ?', (url,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT count(*) FROM downloads').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
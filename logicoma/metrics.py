@@ -0,0 +1,345 @@
+"""
+Metrics of the crawling.
+
+Crawler records metrics to its Metrics instance (`crawler.metrics`), they can
+be read by snapshot(), watched by hooks or exported in Prometheus text format
+by MetricsServer.
+
+Recorded metrics:
+    tasks_enqueued_total -- tasks added to the queue
+    tasks_dequeued_total -- tasks taken from the queue
+    tasks_filtered_total -- tasks rejected by queue filters
+    tasks_unhandled_total -- tasks without handler
+    tasks_spilled_total -- tasks moved to the spill store of TaskQueue
+    tasks_total{handler, status} -- processed tasks, status is finished or
+        failed
+    handler_seconds{handler} -- histogram of task processing time
+    requests_total{host, status} -- HTTP responses by status code
+    request_errors_total{host} -- failed HTTP requests
+    request_seconds{host} -- histogram of HTTP request latency
+    received_bytes_total -- bytes of response bodies and downloads
+    workers -- number of running workers
+    workers_busy -- number of workers processing a task
+    worker_busy_seconds_total -- time spent by workers processing tasks
+    queue_depth -- number of queued tasks
+    concurrency_limit -- limit of concurrent requests (see: AdaptiveLimit)
+    requests_in_flight -- number of concurrent requests (see: AdaptiveLimit)
+"""
+
+__all__ = ['Metrics', 'MetricsServer', 'ProgressReporter']
+
+import bisect
+import http.server
+import logging
+import socketserver
+import threading
+import time
+
+
+class Histogram:
+    """Histogram with cumulative `buckets` upper bounds."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+               60)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Returns list of tuples of upper bound and cumulative count."""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': self.cumulative()}
+
+
+class Metrics:
+    """
+    Thread-safe collection of counters, gauges and histograms.
+
+    Metric is identified by its name and labels (keyword arguments). Hooks
+    are functions called with kind ('counter', 'gauge' or 'histogram'), name,
+    value and labels dict of every recorded value.
+    """
+
+    def __init__(self, prefix='logicoma_'):
+        self.prefix = prefix
+        self.hooks = []
+        self.started = time.monotonic()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_funcs = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def _call_hooks(self, kind, name, value, labels):
+        for hook in self.hooks:
+            hook(kind, name, value, labels)
+
+    def inc(self, name, value=1, **labels):
+        """Increment counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.hooks:
+            self._call_hooks('counter', name, value, labels)
+
+    def set(self, name, value, **labels):
+        """Set gauge to the value."""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+        if self.hooks:
+            self._call_hooks('gauge', name, value, labels)
+
+    def add(self, name, value, **labels):
+        """Add value to the gauge."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value = self._gauges.get(key, 0) + value
+        if self.hooks:
+            self._call_hooks('gauge', name, value, labels)
+
+    def gauge_func(self, name, func, **labels):
+        """Register gauge which value is returned by `func` when read."""
+        with self._lock:
+            self._gauge_funcs[self._key(name, labels)] = func
+
+    def observe(self, name, value, **labels):
+        """Add value to the histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            try:
+                self._histograms[key].observe(value)
+            except KeyError:
+                self._histograms[key] = Histogram()
+                self._histograms[key].observe(value)
+        if self.hooks:
+            self._call_hooks('histogram', name, value, labels)
+
+    def get(self, name, **labels):
+        """Returns value of the counter or gauge, or None."""
+        key = self._key(name, labels)
+        with self._lock:
+            func = self._gauge_funcs.get(key)
+            if func is None:
+                return self._counters.get(key, self._gauges.get(key))
+        # Gauge functions are called without the lock, they can take other
+        # locks (eg. of the queue) which are held while metrics are recorded.
+        return func()
+
+    def snapshot(self):
+        """
+        Returns dict with 'uptime' in seconds and 'counters', 'gauges' and
+        'histograms' dicts. Metrics are keyed by tuple of name and tuple of
+        label items.
+        """
+        with self._lock:
+            gauges = dict(self._gauges)
+            gauge_funcs = list(self._gauge_funcs.items())
+            snapshot = {
+                'uptime': time.monotonic() - self.started,
+                'counters': dict(self._counters),
+                'gauges': gauges,
+                'histograms': {key: h.snapshot()
+                               for key, h in self._histograms.items()},
+            }
+        gauges.update((key, func()) for key, func in gauge_funcs)
+        return snapshot
+
+    def _format_labels(self, labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(
+            k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+            for k, v in items) + '}'
+
+    def _sorted(self, metrics):
+        # Label values can be of different types (eg. host None).
+        return sorted(metrics.items(), key=lambda item: (
+            item[0][0], self._format_labels(item[0][1])))
+
+    def prometheus(self):
+        """Returns metrics in Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for kind, metrics in (('counter', snapshot['counters']),
+                              ('gauge', snapshot['gauges'])):
+            for name in sorted(set(name for name, _ in metrics)):
+                lines.append('# TYPE {}{} {}'.format(self.prefix, name, kind))
+                for (n, labels), value in self._sorted(metrics):
+                    if n == name:
+                        lines.append('{}{}{} {}'.format(
+                            self.prefix, name, self._format_labels(labels),
+                            value))
+        histograms = snapshot['histograms']
+        for name in sorted(set(name for name, _ in histograms)):
+            lines.append('# TYPE {}{} histogram'.format(self.prefix, name))
+            for (n, labels), h in self._sorted(histograms):
+                if n != name:
+                    continue
+                for bound, count in h['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('{}{}_bucket{} {}'.format(
+                        self.prefix, name,
+                        self._format_labels(labels, [('le', le)]), count))
+                for suffix in ('sum', 'count'):
+                    lines.append('{}{}_{}{} {}'.format(
+                        self.prefix, name, suffix,
+                        self._format_labels(labels), h[suffix]))
+        return '\n'.join(lines) + '\n'
+
+    def total(self, name, **labels):
+        """
+        Returns sum of the counter over all label values, only values with
+        given `labels` are summed.
+        """
+        items = set(labels.items())
+        with self._lock:
+            return sum(value for (n, key), value in self._counters.items()
+                       if n == name and items.issubset(key))
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           http.server.HTTPServer):
+    """http.server.ThreadingHTTPServer, which is new in Python 3.7."""
+
+    daemon_threads = True
+
+
+class MetricsServer:
+    """
+    HTTP server exporting `metrics` in Prometheus text format on path
+    /metrics. Server runs in a daemon thread.
+    """
+
+    def __init__(self, metrics, port=9100, host='127.0.0.1'):
+        self.metrics = metrics
+        metrics_ = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_port
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProgressReporter:
+    """
+    Logs summary of the crawling progress from `metrics` every `interval`
+    seconds in a daemon thread, and once more when it's stopped. Crawler
+    starts and stops the reporter assigned to `crawler.progress`.
+
+    Summary dict (see: summary()) is attached to the log record as attribute
+    `progress`, so it can be used by structured log handlers.
+    """
+
+    def __init__(self, metrics, interval=10, logger=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._last = (time.monotonic(), 0)
+        self._stop_evt = threading.Event()
+        self._thread = None
+
+    def summary(self):
+        """
+        Returns dict with numbers of enqueued, finished and failed tasks,
+        processing rate in tasks per second since the previous summary,
+        queue depth, numbers of workers and busy workers, received bytes and
+        limit of concurrent requests (None if it's not limited).
+        """
+        now = time.monotonic()
+        finished = self.metrics.total('tasks_total', status='finished')
+        failed = self.metrics.total('tasks_total', status='failed')
+        last_time, last_done = self._last
+        self._last = (now, finished + failed)
+        return {
+            'enqueued': self.metrics.total('tasks_enqueued_total'),
+            'finished': finished,
+            'failed': failed,
+            'rate': (finished + failed - last_done) / (now - last_time)
+            if now > last_time else 0,
+            'queue_depth': self.metrics.get('queue_depth') or 0,
+            'workers': self.metrics.get('workers') or 0,
+            'workers_busy': self.metrics.get('workers_busy') or 0,
+            'received_bytes': self.metrics.total('received_bytes_total'),
+            'concurrency_limit': self.metrics.get('concurrency_limit'),
+        }
+
+    def report(self):
+        """Log the summary and return it."""
+        summary = self.summary()
+        message = 'Progress: %d finished, %d failed, %.1f tasks/s, ' \
+            'queue %d, workers %d/%d busy, %.1f MiB received'
+        args = [summary['finished'], summary['failed'], summary['rate'],
+                summary['queue_depth'], summary['workers_busy'],
+                summary['workers'], summary['received_bytes'] / 1024 ** 2]
+        if summary['concurrency_limit'] is not None:
+            message += ', concurrency %d'
+            args.append(summary['concurrency_limit'])
+        self.logger.info(message, *args, extra={'progress': summary})
+        return summary
+
+    def _run(self):
+        while not self._stop_evt.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self._stop_evt.clear()
+        self._last = (time.monotonic(), self._last[1])
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_evt.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.report()
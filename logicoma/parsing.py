@@ -0,0 +1,270 @@
+"""
+HTML parsing of responses.
+"""
+
+__all__ = ['parse', 'LazyPage', 'PageCache', 'LinkExtractor',
+           'extract_links']
+
+import codecs
+import collections
+import hashlib
+import html.parser
+import re
+import threading
+import urllib.parse
+
+import bs4
+
+from . import utils
+
+
+def parse(text, parser='html5lib', parse_only=None):
+    """
+    Parse HTML `text`.
+
+    Parser can be name of the BeautifulSoup tree builder ('html5lib', 'lxml',
+    'html.parser', ...), 'selectolax' for selectolax HTMLParser (package
+    selectolax must be installed) or callable which takes the text.
+
+    BeautifulSoup can be restricted to parse only some tags by `parse_only`
+    SoupStrainer, it's ignored by other parsers.
+
+    See: bs4.BeautifulSoup
+    """
+    if callable(parser):
+        return parser(text)
+    if parser == 'selectolax':
+        try:
+            from selectolax.parser import HTMLParser
+        except ImportError:
+            raise ImportError('selectolax parser requires selectolax package')
+        return HTMLParser(text)
+    return bs4.BeautifulSoup(text, parser, parse_only=parse_only)
+
+
+class LazyPage:
+    """
+    Page which is parsed on the first access to its document.
+
+    Attributes and calls are delegated to the parsed document, so page can be
+    used as the document itself, eg. `page.find_all('a')`.
+
+    See: parse()
+    """
+
+    def __init__(self, text, parser='html5lib', parse_only=None, cache=None):
+        self.text = text
+        self.parser = parser
+        self.parse_only = parse_only
+        self.cache = cache
+        self._document = None
+
+    @property
+    def parsed(self):
+        """True if page was already parsed."""
+        return self._document is not None
+
+    @property
+    def document(self):
+        """Parsed document."""
+        if self._document is None:
+            if self.cache is not None:
+                self._document = self.cache.parse(self.text, self.parser,
+                                                  self.parse_only)
+            else:
+                self._document = parse(self.text, self.parser,
+                                       self.parse_only)
+            self.text = None
+        return self._document
+
+    def __getattr__(self, name):
+        return getattr(self.document, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.document(*args, **kwargs)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__,
+                                'parsed' if self.parsed else 'not parsed')
+
+
+class PageCache:
+    """
+    Bounded cache of parsed documents keyed by hash of the page text, so
+    byte-identical pages (eg. served under different URLs) are parsed only
+    once. At most `maxsize` least recently used documents are kept.
+
+    Cached documents are shared, so they must not be modified. Numbers of
+    cache hits and misses are counted in `hits` and `misses`. Cache can be
+    used by multiple threads.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._documents = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, text, parser='html5lib', parse_only=None):
+        """
+        Returns cached document of the text or parse it.
+
+        See: parse()
+        """
+        key = (hashlib.sha1(text.encode('utf-8', 'surrogatepass')).digest(),
+               parser, repr(parse_only))
+        with self._lock:
+            try:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return self._documents[key]
+            except KeyError:
+                self.misses += 1
+        # Parse without lock, so other threads are not blocked. The same page
+        # can be parsed concurrently twice.
+        document = parse(text, parser, parse_only)
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return document
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __repr__(self):
+        return '<{} hits={} misses={} size={}>'.format(
+            self.__class__.__name__, self.hits, self.misses, len(self))
+
+
+def _parse_selector(selector):
+    """
+    Parse selector 'tag[attr], ...' to dict of tag and tuple of attributes,
+    tag '*' matches all tags.
+    """
+    tags = {}
+    for part in selector.split(','):
+        match = re.fullmatch(r'\s*([\w*-]+)\[([\w-]+)\]\s*', part)
+        if not match:
+            raise ValueError('invalid selector {}'.format(repr(part)))
+        tag, attr = match.group(1).lower(), match.group(2).lower()
+        tags[tag] = tags.get(tag, ()) + (attr,)
+    return tags
+
+
+class LinkExtractor(html.parser.HTMLParser):
+    """
+    Incremental extractor of links from HTML, it doesn't build any document
+    tree. Text is fed in chunks by feed() and found links are appended to
+    `links`, which can be emptied after every chunk, so memory doesn't grow
+    with the size of the page.
+
+    Links are taken from attributes given by `selector` ('tag[attr]' items
+    separated by comma, '*' matches all tags). They are resolved against
+    `url` of the page or its <base href>, links with other schemes than
+    `schemes` and malformed links are skipped. Links are normalized by
+    `normalize` function (if it's not None) and only those searched by
+    regular expression `pattern` are kept.
+
+    See: extract_links(), utils.url_normalize()
+    """
+
+    SELECTOR = 'a[href], area[href]'
+    SCHEMES = ('http', 'https')
+
+    def __init__(self, url, selector=SELECTOR, pattern=None,
+                 schemes=SCHEMES, normalize=utils.url_normalize):
+        super().__init__()
+        self.base = url
+        self.tags = _parse_selector(selector)
+        self.pattern = re.compile(pattern) \
+            if isinstance(pattern, str) else pattern
+        self.schemes = frozenset(schemes)
+        self.normalize = normalize
+        self.links = []
+        self._base_found = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'base' and not self._base_found:
+            # Only the first <base href> is used.
+            for name, value in attrs:
+                if name == 'href' and value:
+                    try:
+                        self.base = urllib.parse.urljoin(self.base,
+                                                         value.strip())
+                    except ValueError:
+                        pass
+                    self._base_found = True
+                    break
+        names = self.tags.get(tag, ())
+        if '*' in self.tags:
+            names += self.tags['*']
+        if names:
+            for name, value in attrs:
+                if name in names and value:
+                    self._add(value)
+
+    def _add(self, value):
+        try:
+            url = urllib.parse.urljoin(self.base, value.strip())
+            if url.partition(':')[0].lower() not in self.schemes:
+                return
+            if self.normalize is not None:
+                url = self.normalize(url)
+        except ValueError:
+            # Malformed link (eg. unclosed IPv6 address) is skipped.
+            return
+        if self.pattern is None or self.pattern.search(url):
+            self.links.append(url)
+
+
+def extract_links(chunks, url, encoding=None, **kwargs):
+    """
+    Iterate links of HTML page given as iterable of byte `chunks` (eg.
+    response.iter_content()), page is parsed while it's iterated.
+
+    Chunks are decoded by `encoding`. If it's None, then encoding is taken
+    from <meta charset> in the beginning of the page or UTF-8 is used.
+    Keyword arguments are passed to LinkExtractor.
+
+    See: LinkExtractor
+    """
+    extractor = LinkExtractor(url, **kwargs)
+    decoder = _incremental_decoder(encoding) if encoding else None
+    head = b''
+    for chunk in chunks:
+        if decoder is None:
+            # Charset is looked up in the first 1024 bytes.
+            head += chunk
+            if len(head) < 1024:
+                continue
+            decoder = _incremental_decoder(_sniff_charset(head))
+            chunk, head = head, b''
+        extractor.feed(decoder.decode(chunk))
+        yield from extractor.links
+        extractor.links.clear()
+    if decoder is None:
+        decoder = _incremental_decoder(_sniff_charset(head))
+    extractor.feed(decoder.decode(head, True))
+    extractor.close()
+    yield from extractor.links
+
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+def _sniff_charset(data):
+    match = _CHARSET_RE.search(data, 0, 1024)
+    return match.group(1).decode('ascii') if match else 'utf-8'
+
+
+def _incremental_decoder(encoding):
+    try:
+        return codecs.getincrementaldecoder(encoding)('replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')('replace')
@@ -0,0 +1,305 @@
+"""
+Persistence of queued tasks, so crawling can be resumed after crash or
+interruption.
+"""
+
+__all__ = ['TaskStore', 'PersistentTaskQueue']
+
+import importlib
+import itertools
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+from .core import Task, Stop, Handler, TaskQueue
+
+
+logger = logging.getLogger(__name__)
+
+
+def _qualname(obj):
+    return '{}.{}'.format(obj.__module__, obj.__qualname__)
+
+
+def _import(qualname):
+    module, _, name = qualname.rpartition('.')
+    obj = importlib.import_module(module)
+    for attr in name.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class TaskStore:
+    """
+    SQLite database `path` of tasks.
+
+    Stored are task URL, data, priority, identity of the handler, retry count
+    of Download, class of the task, number of retries (see: RetryPolicy) and
+    depth. Data must be picklable. Changes are written in
+    batches, when `batch_size` changes are pending or `interval` seconds
+    elapsed since the last write, or by flush().
+
+    Handlers of loaded tasks are looked up in the `handler_list`.
+
+    Store can be used as spill store of bounded TaskQueue.
+    """
+
+    COLUMNS = 'id, url, data, priority, handler, retry, class, attempt, depth'
+
+    def __init__(self, path, batch_size=1000, interval=5, handler_list=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.handler_list = handler_list
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS tasks '
+                         '(id INTEGER PRIMARY KEY, url TEXT, data BLOB, '
+                         'priority INTEGER, handler TEXT, retry INTEGER, '
+                         'class TEXT, attempt INTEGER DEFAULT 0, '
+                         'depth INTEGER DEFAULT 0)')
+        # Stores created by older versions miss some columns.
+        columns = [row[1] for row in
+                   self._db.execute('PRAGMA table_info(tasks)')]
+        for column in ('attempt', 'depth'):
+            if column not in columns:
+                self._db.execute('ALTER TABLE tasks ADD COLUMN {} INTEGER '
+                                 'DEFAULT 0'.format(column))
+        self._db.execute('CREATE INDEX IF NOT EXISTS tasks_order '
+                         'ON tasks (priority DESC, id)')
+        self._lock = threading.Lock()
+        self._added = []
+        self._removed = []
+        self._flushed = time.monotonic()
+
+    @staticmethod
+    def dump(task):
+        """Returns tuple of task columns."""
+        if isinstance(task.handler, Handler):
+            handler = _qualname(task.handler.func)
+        else:
+            handler = None
+        data = pickle.dumps(task._data) if task._data else None
+        return (task.url, data, task.priority, handler,
+                getattr(task, 'retry', 0), _qualname(type(task)),
+                task.attempt, task.depth)
+
+    @staticmethod
+    def storable(task):
+        """
+        Returns True if the task can be loaded with its handler, which is
+        either Handler or method of the task itself (eg. Download).
+        """
+        return isinstance(task.handler, Handler) or \
+            getattr(task.handler, '__self__', None) is task
+
+    @staticmethod
+    def load(url, data, priority, handler, retry, cls, attempt=0, depth=0,
+             handler_list=None):
+        """
+        Create task from its columns. Handler is looked up by its identity in
+        the `handler_list`, if it's not found then task is routed by its URL.
+        """
+        data = pickle.loads(data) if data else None
+        try:
+            task = _import(cls)(url, data, priority=priority)
+        except (ImportError, AttributeError, TypeError):
+            logger.warning('Can not restore %s, using Task', cls)
+            task = Task(url, data, priority=priority)
+        if retry:
+            task.retry = retry
+        task.attempt = attempt
+        task.depth = depth
+        if handler and handler_list is not None:
+            for h in handler_list:
+                if _qualname(h.func) == handler:
+                    task.handler = h
+                    break
+            else:
+                task.handler, task.match = handler_list.route(url)
+        return task
+
+    def add(self, id, task):
+        """Add task with the given `id`."""
+        with self._lock:
+            self._added.append((id,) + self.dump(task))
+            self._maybe_flush()
+
+    def add_many(self, items):
+        """Add tasks from iterable of tuples of id and task."""
+        with self._lock:
+            self._added.extend((id,) + self.dump(task) for id, task in items)
+            self._maybe_flush()
+
+    def remove(self, id):
+        """Remove task with the given `id`."""
+        with self._lock:
+            self._removed.append((id,))
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if (len(self._added) + len(self._removed) >= self.batch_size or
+                time.monotonic() - self._flushed >= self.interval):
+            self._flush()
+
+    def _flush(self):
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO tasks (' +
+                                 self.COLUMNS + ') VALUES '
+                                 '(?, ?, ?, ?, ?, ?, ?, ?, ?)', self._added)
+            self._db.executemany('DELETE FROM tasks WHERE id = ?',
+                                 self._removed)
+        self._added = []
+        self._removed = []
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        """Write all pending changes."""
+        with self._lock:
+            self._flush()
+
+    def tasks(self, handler_list=None, below=None):
+        """
+        Iterate stored tasks in the order of their addition, yields tuples of
+        id and task. If `below` is given, then only tasks with lower id are
+        returned.
+
+        See: load()
+        """
+        self.flush()
+        if below is None:
+            rows = self._db.execute('SELECT ' + self.COLUMNS +
+                                    ' FROM tasks ORDER BY id')
+        else:
+            rows = self._db.execute('SELECT ' + self.COLUMNS +
+                                    ' FROM tasks WHERE id < ? '
+                                    'ORDER BY id', (below,))
+        for row in rows.fetchall():
+            yield row[0], self.load(*row[1:], handler_list=handler_list)
+
+    def pop(self, count):
+        """
+        Remove and return up to `count` tasks with the highest priority, in
+        the order of their addition. Returns list of tuples of id and task.
+        """
+        with self._lock:
+            self._flush()
+            rows = self._db.execute('SELECT ' + self.COLUMNS +
+                                    ' FROM tasks ORDER BY '
+                                    'priority DESC, id LIMIT ?',
+                                    (count,)).fetchall()
+            with self._db:
+                self._db.executemany('DELETE FROM tasks WHERE id = ?',
+                                     [(row[0],) for row in rows])
+        return [(row[0], self.load(*row[1:], handler_list=self.handler_list))
+                for row in rows]
+
+    def max_id(self):
+        """Returns the highest id of stored tasks or -1."""
+        self.flush()
+        row = self._db.execute('SELECT max(id) FROM tasks').fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute('SELECT count(*) FROM tasks').fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+class PersistentTaskQueue(TaskQueue):
+    """
+    TaskQueue which mirrors queued tasks in the TaskStore at `path`.
+
+    Task is removed from the store when it's done (see: task_done()), so tasks
+    processed during crash are processed again after resume. Task deferred by
+    defer() (eg. delayed retry) is kept in the store until it's put again.
+    Stop tasks are not stored.
+
+    Crawling is resumed by Crawler.start(resume=True).
+    """
+
+    def __init__(self, path, batch_size=1000, interval=5, maxsize=0):
+        super().__init__(maxsize)
+        self.store = TaskStore(path, batch_size, interval)
+        # Tasks stored before the queue was created, only those are restored.
+        self._restorable = self.store.max_id() + 1
+        self._counter = itertools.count(self._restorable)
+        self._local = threading.local()
+        # Id of deferred task object -> its id in the store.
+        self._deferred = {}
+
+    def _put(self, task):
+        if not isinstance(task, Stop):
+            self._remove_deferred(task)
+            self.store.add(task._seq, task)
+        super()._put(task)
+
+    def _put_many(self, tasks):
+        stored = [task for task in tasks if not isinstance(task, Stop)]
+        for task in stored:
+            self._remove_deferred(task)
+        self.store.add_many((task._seq, task) for task in stored)
+        super()._put_many(tasks)
+
+    def _remove_deferred(self, task):
+        stored = self._deferred.pop(id(task), None)
+        if stored is not None:
+            self.store.remove(stored)
+
+    def defer(self, task):
+        """
+        Keep the `task` got by this thread in the store after task_done(),
+        until it's put to the queue again.
+        """
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            self._local.current = None
+            with self.mutex:
+                # Update the stored task, eg. its attempt.
+                self.store.add(current, task)
+                self._deferred[id(task)] = current
+
+    def _get(self):
+        task = super()._get()
+        self._local.current = None if isinstance(task, Stop) else task._seq
+        return task
+
+    def task_done(self):
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            self.store.remove(current)
+            self._local.current = None
+        super().task_done()
+
+    def restore(self, handler_list):
+        """
+        Queue all tasks stored before the queue was created, returns their
+        count. Handlers of the tasks are looked up in the `handler_list` by
+        their identity or routed by URL. Tasks are restored only once.
+        """
+        count = 0
+        with self.mutex:
+            tasks = self.store.tasks(handler_list, below=self._restorable)
+            self._restorable = 0
+            for id, task in tasks:
+                if task.handler is None:
+                    task.handler, task.match = handler_list.route(task.url)
+                # Put directly to the heap, task is already stored.
+                task._seq = id
+                super()._put(task)
+                self.unfinished_tasks += 1
+                count += 1
+            self.not_empty.notify_all()
+        logger.info('%d tasks restored from %s', count, self.store.path)
+        return count
+
+    def flush(self):
+        """Write all pending changes to the store."""
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
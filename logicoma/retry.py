@@ -0,0 +1,79 @@
+"""
+Retrying of failed tasks.
+"""
+
+__all__ = ['Retry', 'RetryPolicy']
+
+import random
+
+import requests
+
+from . import utils
+
+
+class Retry(Exception):
+    """
+    Raised by handler to process the task again after `delay` seconds. If
+    `delay` is None, then it's given by the retry policy.
+
+    Task is retried regardless of the number of retries of the policy.
+    """
+
+    def __init__(self, delay=None):
+        super().__init__(delay)
+        self.delay = delay
+
+
+class RetryPolicy:
+    """
+    Policy of retrying failed tasks, it can be set for a handler (see:
+    Handler) or for all tasks of the crawler (`crawler.retry`).
+
+    Task is retried at most `retries` times when its handler raises one of
+    the `exceptions` or HTTPError (eg. by response.raise_for_status()) of
+    response with status code from `status`.
+
+    Retry is delayed by exponential backoff, `backoff` seconds multiplied by
+    `factor` for every next attempt, up to `max_delay` seconds. Delay is
+    randomly shortened up to `jitter` fraction, so retries of many tasks are
+    spread in time. Retry-After header of the response is used instead, if
+    it's present.
+    """
+
+    STATUS = (408, 429, 500, 502, 503, 504)
+    EXCEPTIONS = (requests.ConnectionError, requests.Timeout,
+                  requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, retries=3, backoff=1, factor=2, max_delay=300,
+                 jitter=0.5, status=STATUS, exceptions=EXCEPTIONS):
+        self.retries = retries
+        self.backoff = backoff
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.status = set(status)
+        self.exceptions = tuple(exceptions)
+
+    def retryable(self, error):
+        """Returns True if task which failed by the `error` can be retried."""
+        response = getattr(error, 'response', None)
+        if isinstance(error, requests.HTTPError) and response is not None:
+            return response.status_code in self.status
+        return isinstance(error, self.exceptions)
+
+    def delay(self, attempt, error=None):
+        """
+        Returns number of seconds to wait before retry after `attempt`
+        previous retries of the task failed by the `error`.
+        """
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = utils.retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.backoff * self.factor ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def __repr__(self):
+        return '<{} retries={} backoff={}>'.format(
+            self.__class__.__name__, self.retries, self.backoff)
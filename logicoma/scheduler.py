@@ -0,0 +1,538 @@
+"""
+Scheduling of tasks with respect to the hosts they request.
+"""
+
+__all__ = ['TokenBucket', 'Throttle', 'HostQueue', 'RoundRobinQueue',
+           'AdaptiveLimit', 'DelayedTasks']
+
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from . import core
+from . import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Bucket is refilled with `rate` tokens per
+    second up to `burst` tokens, every request consumes one token. If `rate`
+    is None, then requests are not limited.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.timestamp = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.timestamp:
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.timestamp) * self.rate)
+            self.timestamp = now
+
+    def delay(self, now=None):
+        """Returns number of seconds until token will be available."""
+        if not self.rate:
+            return 0
+        if now is None:
+            now = time.monotonic()
+        self._refill(now)
+        return max(0, (1 - self.tokens) / self.rate)
+
+    def consume(self, now=None):
+        """Consume one token, bucket can go into debt."""
+        if self.rate:
+            self._refill(time.monotonic() if now is None else now)
+            self.tokens -= 1
+
+    def __repr__(self):
+        return '<{} rate={} burst={}>'.format(self.__class__.__name__,
+                                              self.rate, self.burst)
+
+
+class Throttle:
+    """
+    Per-host request rate limits.
+
+    Every host has its own token bucket. Global limit is given by `rate`
+    (requests per second) and `burst`, limits of individual hosts can be set
+    in `hosts` dict mapping host name to rate or tuple of rate and burst.
+
+    Handler delay (see: Handler) is minimal time between the previous request
+    to the host and the task of the handler.
+    """
+
+    def __init__(self, rate=None, burst=1, hosts=None):
+        self.rate = rate
+        self.burst = burst
+        self.hosts = dict(hosts or {})
+        self._buckets = {}
+        self._last = {}
+
+    def bucket(self, host):
+        """Returns token bucket of the host."""
+        try:
+            return self._buckets[host]
+        except KeyError:
+            limit = self.hosts.get(host, (self.rate, self.burst))
+            if not isinstance(limit, tuple):
+                limit = (limit, self.burst)
+            bucket = self._buckets[host] = TokenBucket(*limit)
+            return bucket
+
+    def delay(self, host, task, now):
+        """
+        Returns number of seconds until the task requesting the host can be
+        processed.
+        """
+        delay = self.bucket(host).delay(now)
+        handler_delay = getattr(task.handler, 'delay', 0)
+        if handler_delay and host in self._last:
+            delay = max(delay, self._last[host] + handler_delay - now)
+        return delay
+
+    def acquire(self, host, now):
+        """Record request to the host."""
+        self.bucket(host).consume(now)
+        self._last[host] = now
+
+
+class AdaptiveLimit:
+    """
+    Limit of concurrent requests adjusted by observed responses, used by the
+    Client (see: Client.limiter).
+
+    The limit starts at `initial` (default `min`) and it's adjusted between
+    `min` and `max` by AIMD: it's increased by one after `limit` successful
+    requests and multiplied by `backoff` after an overload. Overload is a
+    response with status code from `status`, connection error, timeout or
+    response slower than `latency` seconds (if it's given), other errors
+    don't change the limit. Limit is decreased at most once per requests
+    which were in flight together, and no request is started before time
+    given by Retry-After header of the overload response.
+
+    Crawler should be started with `max` threads, so the limit is given by
+    the controller, eg.::
+
+        crawler.client.limiter = AdaptiveLimit(max=32)
+        crawler.start(links, count=32)
+
+    Streamed requests (eg. downloads) are counted only until their headers
+    are received. Current limit is recorded to `metrics` as gauge
+    concurrency_limit, Crawler sets it to its own metrics.
+    """
+
+    def __init__(self, min=1, max=32, initial=None, latency=None,
+                 backoff=0.5, status=(429, 503)):
+        self.min = min
+        self.max = max
+        self.limit = initial or min
+        self.latency = latency
+        self.backoff = backoff
+        self.status = set(status)
+        self.in_flight = 0
+        self.metrics = None
+        self._successes = 0
+        self._decreased = time.monotonic()
+        self._blocked_until = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until request can be started. Returns the start time which must
+        be passed to release().
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    self._cond.wait(self._blocked_until - now)
+                elif self.in_flight >= self.limit:
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+            self._record('requests_in_flight', self.in_flight)
+            return now
+
+    def release(self, start, response=None, error=None):
+        """
+        Finish request started at `start` with `response` or `error` and
+        adjust the limit.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            self._record('requests_in_flight', self.in_flight)
+            if self._overloaded(response, error, now - start):
+                if response is not None:
+                    delay = utils.retry_after(response)
+                    if delay:
+                        self._blocked_until = max(self._blocked_until,
+                                                  now + delay)
+                # Responses of requests started before the last decrease
+                # were already taken into account.
+                if start >= self._decreased:
+                    self._set_limit(int(self.limit * self.backoff))
+                    self._decreased = now
+            elif error is None:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self._set_limit(self.limit + 1)
+            self._cond.notify_all()
+
+    def _overloaded(self, response, error, latency):
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError,
+                                      requests.Timeout))
+        return response.status_code in self.status or \
+            bool(self.latency and latency > self.latency)
+
+    def _set_limit(self, limit):
+        limit = max(self.min, min(self.max, limit))
+        self._successes = 0
+        if limit != self.limit:
+            logger.debug('Concurrency limit %d -> %d', self.limit, limit)
+            self.limit = limit
+        self._record('concurrency_limit', limit)
+
+    def _record(self, name, value):
+        if self.metrics is not None:
+            self.metrics.set(name, value)
+
+    def __repr__(self):
+        return '<{} limit={} in_flight={}>'.format(
+            self.__class__.__name__, self.limit, self.in_flight)
+
+
+class DelayedTasks:
+    """
+    Heap of tasks waiting for their time, eg. retries. Tasks are passed to
+    `push` function by a daemon thread when they are due, so they don't
+    occupy workers nor the queue. If push fails (eg. bounded queue is full),
+    then the task is pushed again after `RETRY_DELAY` seconds.
+    """
+
+    RETRY_DELAY = 1
+
+    def __init__(self, push):
+        self.push = push
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def add(self, task, delay):
+        """Push the task after `delay` seconds."""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay,
+                                        next(self._counter), task))
+            if self._thread is None:
+                self._closed = False
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                # Task is removed after it's pushed, so it's always either
+                # delayed or queued.
+                task = self._heap[0][2]
+                try:
+                    self.push(task)
+                except Exception as e:
+                    logger.warning('%s can not be pushed, retry in %d '
+                                   'seconds: %r', task, self.RETRY_DELAY, e)
+                    heapq.heapreplace(self._heap, (
+                        time.monotonic() + self.RETRY_DELAY,
+                        next(self._counter), task))
+                    continue
+                heapq.heappop(self._heap)
+
+    def clear(self):
+        """Remove all delayed tasks and return them."""
+        with self._cond:
+            tasks = [task for _, _, task in sorted(self._heap)]
+            self._heap.clear()
+            self._cond.notify_all()
+            return tasks
+
+    def close(self):
+        """Stop pushing tasks, delayed tasks are kept."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def __len__(self):
+        # Without lock, so it can be checked while holding a queue lock.
+        return len(self._heap)
+
+
+class HostQueue(queue.Queue):
+    """
+    Task queue which respects per-host rate limits given by `throttle`.
+
+    Every host has its own priority queue. Task with the highest priority is
+    returned from hosts which can be requested now, so workers don't sleep
+    while tasks of other hosts are waiting. Tasks of the same host with the
+    same priority are returned in the order they were added.
+    Stop and Abort are returned when their priority is higher than priorities
+    of all queued tasks, so Stop waits for throttled tasks.
+
+    If `max_active` is given, then at most `max_active` tasks of every host
+    are processed at once. Task is processed until task_done() is called by
+    the thread which got it.
+
+    Limit `maxsize` is soft as for AbortableQueue, non-blocking put exceeds
+    it.
+
+    Ready hosts are kept in a heap, hosts waiting for `throttle` in a heap by
+    the time they will be ready, so get() doesn't depend on number of hosts.
+    Delay of a host is computed when its next task changes or when its task
+    is returned, limits of `throttle` shouldn't change meanwhile.
+
+    See: AbortableQueue
+    """
+
+    aborted = False
+
+    def __init__(self, throttle=None, maxsize=0, max_active=None):
+        self.throttle = throttle or Throttle()
+        self.max_active = max_active
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.hosts = {}
+        # Host -> number of tasks being processed.
+        self.active = {}
+        self._size = 0
+        self._counter = itertools.count()
+        self._local = threading.local()
+        # Hosts with queued tasks are ready, waiting for the throttle or
+        # blocked by max_active. Heap entries are tuples (key, seq, host),
+        # entry is valid only while seq is the current entry of the host.
+        self._ready = []
+        self._waiting = []
+        self._blocked = set()
+        self._entries = {}
+        # Priority -> number of queued tasks with URL.
+        self._priorities = {}
+
+    def put(self, task, block=True, timeout=None):
+        """See: AbortableQueue.put()"""
+        if block or self.maxsize <= 0:
+            super().put(task, block, timeout)
+        else:
+            with self.not_full:
+                self._put(task)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+
+    def _qsize(self):
+        return self._size
+
+    def _put(self, task):
+        host = utils.url_host(task.url) if task.url is not None else None
+        task._seq = next(self._counter)
+        heap = self.hosts.setdefault(host, [])
+        heapq.heappush(heap, task)
+        self._size += 1
+        # Tasks without URL (eg. Stop) are not throttled.
+        if host is not None:
+            self._priorities[task.priority] = \
+                self._priorities.get(task.priority, 0) + 1
+            if heap[0] is task:
+                self._schedule(host, time.monotonic())
+
+    def _schedule(self, host, now):
+        """Add host with queued tasks to ready, waiting or blocked hosts."""
+        seq = self._entries[host] = next(self._counter)
+        if self.max_active and self.active.get(host, 0) >= self.max_active:
+            self._blocked.add(host)
+            return
+        self._blocked.discard(host)
+        delay = self.throttle.delay(host, self.hosts[host][0], now)
+        if delay > 0:
+            heapq.heappush(self._waiting, (now + delay, seq, host))
+        else:
+            heapq.heappush(self._ready, (self._key(host), seq, host))
+
+    def _get(self):
+        return self._get_ready()[0]
+
+    def _get_ready(self):
+        """
+        Pop task from hosts which can be requested now. Returns tuple of the
+        task and None, or None and number of seconds until some task will be
+        ready (None if it's unknown).
+        """
+        now = time.monotonic()
+        while self._waiting and self._waiting[0][0] <= now:
+            _, seq, host = heapq.heappop(self._waiting)
+            if self._entries.get(host) == seq:
+                self._schedule(host, now)
+        ready = self._ready
+        while ready and self._entries.get(ready[0][2]) != ready[0][1]:
+            heapq.heappop(ready)
+        stop = self.hosts.get(None)
+        if stop and self._stop_ready(stop[0]):
+            host = None
+        elif ready:
+            host = heapq.heappop(ready)[2]
+        else:
+            # Blocked hosts are woken up by task_done().
+            return None, self._waiting[0][0] - now if self._waiting else None
+        heap = self.hosts[host]
+        task = heapq.heappop(heap)
+        if host is not None:
+            self.throttle.acquire(host, now)
+            self.active[host] = self.active.get(host, 0) + 1
+            self._priorities[task.priority] -= 1
+            if not self._priorities[task.priority]:
+                del self._priorities[task.priority]
+            self._selected(host, task)
+        if not heap:
+            self._remove_host(host)
+        elif host is not None:
+            self._schedule(host, now)
+        self._local.host = host
+        self._size -= 1
+        return task, None
+
+    def _stop_ready(self, task):
+        """
+        Returns True if task without URL (eg. Stop) can be returned, its
+        priority must be higher than priorities of all queued tasks.
+        """
+        return not self._priorities or task.priority > max(self._priorities)
+
+    def _key(self, host):
+        """
+        Returns key of ready `host`, host with the lowest key is selected.
+        """
+        return self.hosts[host][0]
+
+    def _selected(self, host, task):
+        """Called when `task` of `host` is selected."""
+
+    def _remove_host(self, host):
+        del self.hosts[host]
+        self._entries.pop(host, None)
+        self._blocked.discard(host)
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return task which can be processed now. If no task is
+        ready, then it blocks until some task will be ready.
+
+        See: queue.Queue.get()
+        """
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        with self.not_empty:
+            while True:
+                if self.aborted:
+                    return core.Abort()
+                task, wait = self._get_ready()
+                if task is not None:
+                    self.not_full.notify()
+                    return task
+                if not block:
+                    raise queue.Empty
+                if timeout is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.not_empty.wait(wait)
+
+    def abort(self):
+        """Abort the queue and wake up all waiting threads."""
+        with self.mutex:
+            self.aborted = True
+            self.not_empty.notify_all()
+
+    def tasks(self):
+        """Returns list of queued tasks."""
+        with self.mutex:
+            return [task for heap in self.hosts.values() for task in heap]
+
+    def task_done(self):
+        """
+        Indicate that the task got by this thread is processed.
+
+        See: queue.Queue.task_done()
+        """
+        with self.not_empty:
+            host = getattr(self._local, 'host', None)
+            if host is not None:
+                self._local.host = None
+                self.active[host] -= 1
+                if not self.active[host]:
+                    del self.active[host]
+                # Tasks of the host can be ready now.
+                if host in self._blocked:
+                    self._schedule(host, time.monotonic())
+                self.not_empty.notify()
+        super().task_done()
+
+
+class RoundRobinQueue(HostQueue):
+    """
+    Host queue which takes turns between hosts, so a host with many tasks
+    doesn't delay tasks of other hosts.
+
+    Hosts are weighted by the priority of their next task, host with task of
+    priority p gets twice as many turns as host with task of priority p - 1
+    (see: weight()). Tasks of the same host are returned by their priority.
+    Stop and Abort are returned when their priority is higher than priorities
+    of all queued tasks.
+
+    See: HostQueue
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        # Virtual time of hosts, host with the lowest one has its turn.
+        self._pass = {}
+        self._time = 0
+
+    def weight(self, task):
+        """Returns share of turns of the host with the next `task`."""
+        return 2.0 ** max(-10, min(10, task.priority))
+
+    def _key(self, host):
+        return self._pass.setdefault(host, self._time)
+
+    def _selected(self, host, task):
+        self._time = self._pass[host]
+        self._pass[host] = self._time + 1 / self.weight(task)
+
+    def _remove_host(self, host):
+        super()._remove_host(host)
+        # Idle host doesn't save its turns for later.
+        self._pass.pop(host, None)
@@ -6,6 +6,7 @@ import logging
 import requests
 
 from .core import Task
+from .retry import Retry
 
 
 logger = logging.getLogger(__name__)
@@ -15,12 +16,15 @@ class Download(Task):
     """
     Task for downloading files. Handler argument is ignored.
 
-    If retry parameter is greater than 0, then task is re-added to the queue if
-    download fails. Re-adding decrements the retry and increments the priority.
+    If retry parameter is greater than 0, then task is retried if download
+    fails, retry is decremented by every attempt. Retries are delayed by the
+    retry policy of the crawler (see: RetryPolicy).
 
     `data` are passed to Client.download method as **kwargs.
     """
 
+    __slots__ = ('retry',)
+
     def __init__(self, *args, retry=0, **kwargs):
         kwargs['handler'] = self.download
         super().__init__(*args, **kwargs)
@@ -29,10 +33,9 @@ class Download(Task):
     def download(self, client, url, data):
         try:
             client.download(url, **data)
-        except requests.RequestException:
+        except requests.RequestException as e:
             if self.retry > 0:
-                logger.warn('%s failed, re-adding', self)
+                logger.warning('%s failed, retrying', self)
                 self.retry -= 1
-                self.priority += 1
-                return [self]
+                raise Retry() from e
             raise
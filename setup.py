@@ -32,12 +32,15 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3 :: Only',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Topic :: Internet :: WWW/HTTP',
     ],
     packages=['logicoma'],
-    install_requires=['requests', 'bs4', 'html5lib']
+    python_requires='>=3.6',
+    install_requires=['requests', 'bs4', 'html5lib'],
+    extras_require={
+        'lxml': ['lxml'],
+        'selectolax': ['selectolax'],
+    },
 )
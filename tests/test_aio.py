@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from logicoma import aio, core
+
+
+class AsyncCrawlerTestCase(unittest.TestCase):
+    def test_handlers(self):
+        """
+        Test if both asynchronous and synchronous handlers are processed and
+        get appropriate client.
+        """
+        crawler = aio.AsyncCrawler()
+        visited = []
+
+        @crawler.handler(r'^async/')
+        async def async_handler(client, url):
+            visited.append((url, type(client)))
+            return ['sync/' + url]
+
+        @crawler.handler(r'^asyncgen/')
+        async def async_gen_handler(url):
+            visited.append((url, None))
+            yield 'sync/' + url
+
+        @crawler.handler(r'^sync/')
+        def sync_handler(client, url):
+            visited.append((url, type(client)))
+
+        crawler.start(['async/1', 'asyncgen/2'], count=4)
+        self.assertCountEqual(visited, [
+            ('async/1', aio.AsyncClient),
+            ('asyncgen/2', None),
+            ('sync/async/1', core.Client),
+            ('sync/asyncgen/2', core.Client),
+        ])
+
+    def test_priority(self):
+        """
+        Test if queued tasks are processed by their priority.
+        """
+        crawler = aio.AsyncCrawler()
+        visited = []
+
+        @crawler.handler(r'.*')
+        async def handler(url):
+            visited.append(url)
+
+        for i in range(10):
+            crawler.push_task(core.Task(str(i), priority=i))
+        crawler.start([], count=1)
+        self.assertEqual(visited, [str(i) for i in reversed(range(10))])
+
+    def test_stop(self):
+        """
+        Test if stop() from a handler stops waiting workers and remaining
+        tasks are passed to on_stop.
+        """
+        crawler = aio.AsyncCrawler()
+        remaining = []
+        crawler.on_stop = remaining.extend
+
+        @crawler.handler(r'^stop$')
+        async def stop_handler():
+            crawler.stop()
+            return ['a', 'b']
+
+        @crawler.handler(r'^[ab]$')
+        async def handler():
+            pass
+
+        crawler.start(['stop'], count=4)
+        self.assertEqual(sorted(task.url for task in remaining), ['a', 'b'])
+
+    def test_executor(self):
+        """
+        Test if `count` synchronous handlers are processed concurrently.
+        """
+        crawler = aio.AsyncCrawler()
+        count = 64
+        barrier = threading.Barrier(count, timeout=5)
+        visited = []
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            barrier.wait()
+            visited.append(url)
+
+        crawler.start([str(i) for i in range(count)], count=count)
+        self.assertEqual(len(visited), count)
+
+    def test_restart(self):
+        """
+        Test if stopped crawler processes all tasks when it's started again.
+        """
+        crawler = aio.AsyncCrawler()
+        visited = []
+
+        @crawler.handler(r'^stop$')
+        async def stop_handler():
+            crawler.stop()
+
+        @crawler.handler(r'^a$')
+        async def handler(url):
+            visited.append(url)
+            # Other workers wait for the next task meanwhile.
+            await asyncio.sleep(0.01)
+            return ['b']
+
+        @crawler.handler(r'^b$')
+        async def next_handler(url):
+            visited.append(url)
+
+        crawler.start(['stop'], count=4)
+        crawler.start(['a'], count=4)
+        self.assertEqual(visited, ['a', 'b'])
+
+    def test_threads(self):
+        """
+        Test if synchronous handlers are limited by number of threads, and
+        resume requires persistent queue.
+        """
+        crawler = aio.AsyncCrawler()
+        lock = threading.Lock()
+        running = []
+        concurrency = []
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            with lock:
+                running.append(url)
+                concurrency.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(url)
+
+        crawler.start([str(i) for i in range(8)], count=8, threads=2)
+        self.assertEqual(len(concurrency), 8)
+        self.assertEqual(max(concurrency), 2)
+        with self.assertRaisesRegex(TypeError, 'not persistent'):
+            crawler.start([], resume=True)
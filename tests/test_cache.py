@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import requests
+
+from logicoma import cache
+
+
+def make_response(content, headers=None, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_headers(self):
+        """
+        Test if cache headers are honored.
+        """
+        c = cache.ResponseCache(self.path)
+        c.put('GET', 'http://a/1', {},
+              make_response(b'1', {'Cache-Control': 'max-age=60'}))
+        c.put('GET', 'http://a/2', {},
+              make_response(b'2', {'Cache-Control': 'no-store'}))
+        c.put('GET', 'http://a/3', {}, make_response(b'3'))
+        c.put('GET', 'http://a/4', {},
+              make_response(b'4', {'Cache-Control': 'max-age=60'}, 500))
+        self.assertEqual(c.get('GET', 'http://a/1', {}).content, b'1')
+        self.assertTrue(c.get('GET', 'http://a/1', {}).from_cache)
+        for i in range(2, 5):
+            self.assertIsNone(c.get('GET', 'http://a/{}'.format(i), {}))
+        self.assertEqual((c.hits, c.misses), (2, 3))
+        c.close()
+
+    def test_key(self):
+        """
+        Test if requests are keyed by method, URL and body and streamed or
+        not cached methods are ignored.
+        """
+        c = cache.ResponseCache(self.path, ttl=60, methods=('GET', 'POST'))
+        c.put('POST', 'http://a/', {'data': {'q': 1}}, make_response(b'1'))
+        self.assertIsNotNone(c.get('POST', 'http://a/', {'data': {'q': 1}}))
+        self.assertIsNone(c.get('POST', 'http://a/', {'data': {'q': 2}}))
+        self.assertIsNone(c.get('GET', 'http://a/', {}))
+        self.assertIsNone(c.key('GET', 'http://a/', {'stream': True}))
+        self.assertIsNone(c.key('PUT', 'http://a/', {}))
+        self.assertEqual(c.key('GET', 'http://a/', {'params': {'x': 1}}),
+                         c.key('get', 'http://a/?x=1', {}))
+        c.close()
+
+    def test_eviction(self):
+        """
+        Test if least recently used responses are evicted.
+        """
+        c = cache.ResponseCache(self.path, ttl=60)
+        c.put('GET', 'http://a/0', {}, make_response(bytes(1000)))
+        c.max_size = c.size * 2.5
+        c.put('GET', 'http://a/1', {}, make_response(bytes(1000)))
+        c.get('GET', 'http://a/0', {})
+        c.put('GET', 'http://a/2', {}, make_response(bytes(1000)))
+        self.assertIsNotNone(c.get('GET', 'http://a/0', {}))
+        self.assertIsNone(c.get('GET', 'http://a/1', {}))
+        self.assertIsNotNone(c.get('GET', 'http://a/2', {}))
+        self.assertLessEqual(c.size, c.max_size)
+        c.close()
+
+        # Cache is persistent.
+        c = cache.ResponseCache(self.path)
+        self.assertIsNotNone(c.get('GET', 'http://a/2', {}))
+        c.close()
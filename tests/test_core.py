@@ -1,6 +1,20 @@
+import concurrent.futures
+import functools
+import gc
+import hashlib
+import http.server
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
 import unittest
+import weakref
 
-from logicoma import core
+import requests
+
+from logicoma import core, manifest, metrics, retry, utils
 
 
 class TaskTestCase(unittest.TestCase):
@@ -18,6 +32,17 @@ class TaskTestCase(unittest.TestCase):
         for a, b in zip(tasks_sorted, sorted(tasks_unsorted)):
             self.assertEqual(a.url, b.url)
 
+    def test_data(self):
+        """
+        Test if empty data are not stored and default data are not shared.
+        """
+        t1 = core.Task('1')
+        t2 = core.Task('2')
+        self.assertIsNone(t1._data)
+        t1.data['a'] = 1
+        self.assertEqual(t2.data, {})
+        self.assertFalse(hasattr(t1, '__dict__'))
+
     def test_handler_args(self):
         """
         Test listing of function argument names.
@@ -28,15 +53,77 @@ class TaskTestCase(unittest.TestCase):
         self.assertSetEqual(t._handler_args(),
                             {'arg1', 'arg2', 'kwarg1', 'kwarg2'})
 
+    def test_process_args(self):
+        """
+        Test if handler is called only with arguments it can accept.
+        """
+        def handler(url, data):
+            return url, data
+        t = core.Task('dummy', {'a': 1}, handler=handler)
+        self.assertEqual(t.process(None), ('dummy', {'a': 1}))
+
+    def test_process_class(self):
+        """
+        Test if class handler is instantiated before call.
+        """
+        class Handler:
+            def __call__(self, url, **kwargs):
+                return url, sorted(kwargs)
+        t = core.Task('dummy', handler=Handler)
+        self.assertEqual(t.process(None),
+                         ('dummy', ['client', 'data', 'groups']))
+
+
+class CallPlanTestCase(unittest.TestCase):
+    def test_args(self):
+        """
+        Test if call plan records accepted arguments and **kwargs.
+        """
+        plan = core.CallPlan(lambda client, url=None, **kwargs: None)
+        self.assertSetEqual(plan.args, {'client', 'url'})
+        self.assertTrue(plan.var_keyword)
+        self.assertFalse(plan.is_class)
+
+    def test_cache(self):
+        """
+        Test if call plan is computed only once per function, even for bound
+        methods of different instances.
+        """
+        class A:
+            def handler(self, url):
+                pass
+        self.assertIs(core.CallPlan.of(A().handler),
+                      core.CallPlan.of(A().handler))
+
+    def test_cache_references(self):
+        """
+        Test if closures share call plan of their code and cached callables
+        are not kept alive.
+        """
+        def closure(i):
+            return lambda url: i
+
+        self.assertIs(core.CallPlan.of(closure(1)),
+                      core.CallPlan.of(closure(2)))
+        handlers = [closure(3), functools.partial(lambda url, i: i, i=4)]
+        for handler in handlers:
+            core.CallPlan.of(handler)
+        refs = [weakref.ref(handler) for handler in handlers]
+        del handler, handlers
+        gc.collect()
+        self.assertEqual([ref() for ref in refs], [None, None])
+
 
 class TaskQueueTestCase(unittest.TestCase):
+    queue_class = core.TaskQueue
+
     def test_order(self):
         """
         Tasks with the same priority should be ordered by order of ther
         addition to the queue. For PriorityQueue which uses heap this is not
         true.
         """
-        q = core.TaskQueue()
+        q = self.queue_class()
         correct_order = []
         for i in range(100):
             t = core.Task(str(i))
@@ -51,7 +138,7 @@ class TaskQueueTestCase(unittest.TestCase):
         Test if tasks are sorter by their priority; highest priority number is
         first in queue.
         """
-        q = core.TaskQueue()
+        q = self.queue_class()
         correct_order = []
         for i in range(100):
             t = core.Task(str(i), priority=i)
@@ -61,6 +148,57 @@ class TaskQueueTestCase(unittest.TestCase):
             b = q.get()
             self.assertEqual(a.url, b.url)
 
+    def test_levels(self):
+        """
+        Test order of tasks with a few priority levels, Abort is the first
+        and Stop is the last.
+        """
+        q = self.queue_class()
+        q.put(core.Stop())
+        for i in range(30):
+            q.put(core.Task(str(i), priority=i % 3 - 1))
+        q.put(core.Abort())
+        self.assertIsInstance(q.get(), core.Abort)
+        urls = [q.get().url for _ in range(30)]
+        self.assertEqual(urls, [str(i) for i in range(2, 30, 3)] +
+                         [str(i) for i in range(1, 30, 3)] +
+                         [str(i) for i in range(0, 30, 3)])
+        self.assertIsInstance(q.get(), core.Stop)
+        self.assertEqual(q.qsize(), 0)
+
+    def test_put_many(self):
+        """
+        Test if batches smaller and larger than the queue keep the order of
+        priorities and addition.
+        """
+        q = self.queue_class()
+        q.put(core.Task('first', priority=1))
+        q.put_many(core.Task(str(i), priority=i % 2) for i in range(10))
+        q.put_many([core.Task('last', priority=1)])
+        self.assertEqual(q.unfinished_tasks, 12)
+        urls = [q.get().url for _ in range(12)]
+        self.assertEqual(urls, ['first'] + [str(i) for i in range(1, 10, 2)] +
+                         ['last'] + [str(i) for i in range(0, 10, 2)])
+
+    def test_soft_limit(self):
+        """
+        Test if non-blocking puts exceed the limit of bounded queue and
+        blocking put waits for a free slot.
+        """
+        q = self.queue_class(maxsize=1)
+        q.put(core.Task('a'))
+        q.put(core.Task('b'), False)
+        q.put_many([core.Task('c'), core.Task('d')])
+        self.assertEqual(q.qsize(), 4)
+        with self.assertRaises(queue.Full):
+            q.put(core.Task('e'), timeout=0.01)
+        self.assertEqual([q.get().url for _ in range(4)],
+                         ['a', 'b', 'c', 'd'])
+
+
+class LevelQueueTestCase(TaskQueueTestCase):
+    queue_class = core.LevelQueue
+
 
 class HandlerTestCase(unittest.TestCase):
     def test_priority_sorting(self):
@@ -99,6 +237,36 @@ class HandlerTestCase(unittest.TestCase):
                              {0: '//google.com/?q=search', 1: 'search',
                               'query': 'search'})
 
+    def test_literal(self):
+        """
+        Test extraction of the literal which must be in every matched URL.
+        """
+        dummy_func = lambda: None
+        self.assertEqual(core.Handler(dummy_func, r'//imgur\.com/').literal,
+                         '//imgur.com/')
+        self.assertEqual(core.Handler(dummy_func, r'https?://x\.org').literal,
+                         '://x.org')
+        self.assertEqual(core.Handler(dummy_func, r'ab*c').literal, 'a')
+        self.assertEqual(core.Handler(dummy_func, r'ab|cd').literal, '')
+        self.assertEqual(core.Handler(dummy_func, r'(?i)ab').literal, '')
+        self.assertEqual(core.Handler(dummy_func, r'ab', re.I).literal, '')
+        self.assertEqual(core.Handler(dummy_func, r'(?#c)a(?#c)*').literal, '')
+        self.assertEqual(core.Handler(dummy_func, r'\/[]a]{|.').literal, '')
+        self.assertEqual(core.Handler(dummy_func, r'/ab{2,}c').literal, '/a')
+        # Escape sequences are not literals.
+        for pattern, literal in [(r'\x2fitem/(\d+)', 'item/'),
+                                 (r'/a\0751', '/a'),
+                                 (r'/a\u002fbcd', 'bcd'),
+                                 (r'/ab\U0000002fc', '/ab'),
+                                 (r'/a\N{SOLIDUS}bcd', 'bcd'),
+                                 (r'(x)/\1abc', 'abc'),
+                                 (r'(x)/\123', '/')]:
+            handler = core.Handler(dummy_func, pattern)
+            self.assertEqual(handler.literal, literal)
+        handler = core.Handler(dummy_func, r'\x2fitem/(\d+)')
+        self.assertTrue(handler.match('http://e.com/item/5'))
+        self.assertTrue(core.Handler(dummy_func, r'/a\0751').match('/a=1'))
+
 
 class HandlerListTestCase(unittest.TestCase):
     def test_priority_sorting(self):
@@ -157,6 +325,24 @@ class HandlerListTestCase(unittest.TestCase):
         self.assertEqual(id(handler_list.find_match('a')), id(h3))
         self.assertIsNone(handler_list.find_match('x'))
 
+    def test_route(self):
+        """
+        Test if route returns handler with its match object and the match is
+        used for task groups.
+        """
+        h1 = core.Handler(lambda: None, r'//a\.com/(\d+)')
+        h2 = core.Handler(lambda groups: groups, r'//b\.com/(?P<id>\d+)')
+        handler_list = core.HandlerList([h1, h2])
+
+        handler, match = handler_list.route('https://b.com/42')
+        self.assertIs(handler, h2)
+        self.assertEqual(match.group('id'), '42')
+        self.assertEqual(handler_list.route('https://c.com/42'), (None, None))
+
+        t = core.Task('https://b.com/42', handler=handler)
+        t.match = match
+        self.assertEqual(t.process(None)['id'], '42')
+
 
 class CrawlerTestCase(unittest.TestCase):
     def test_stop(self):
@@ -182,3 +368,450 @@ class CrawlerTestCase(unittest.TestCase):
         def handler():
             pass
         crawler.push_task(core.Abort())
+
+    def test_starter_generator(self):
+        """
+        Test if tasks of the starter generator are processed before it ends.
+        """
+        crawler = core.Crawler()
+        processed = threading.Event()
+        crawler.handler(r'^a$')(processed.set)
+        crawler.handler(r'^b$')(lambda: None)
+        waited = []
+
+        @crawler.starter()
+        def starter():
+            yield 'a'
+            waited.append(processed.wait(5))
+            yield 'b'
+
+        crawler.start()
+        self.assertEqual(waited, [True])
+
+    def test_push_tasks(self):
+        """
+        Test if batch is routed and filtered task by task and queued by one
+        put_many() call.
+        """
+        crawler = core.Crawler()
+        crawler.handler(r'^ok')(lambda: None)
+        crawler.queue_filter_chain.append(lambda task: task.url != 'ok/2')
+        batches = []
+        put_many = crawler.queue.put_many
+        crawler.queue.put_many = lambda tasks: (batches.append(tasks),
+                                                put_many(tasks))
+        count = crawler.push_tasks(core.Task(url) for url in
+                                   ['ok/1', 'ok/2', 'none', 'ok/3'])
+        self.assertEqual(count, 2)
+        self.assertEqual([[t.url for t in batch] for batch in batches],
+                         [['ok/1', 'ok/3']])
+        m = crawler.metrics
+        self.assertEqual(m.get('tasks_enqueued_total'), 2)
+        self.assertEqual(m.get('tasks_filtered_total'), 1)
+        self.assertEqual(m.get('tasks_unhandled_total'), 1)
+        with self.assertRaises(TypeError):
+            crawler.push_tasks(['ok/4'])
+
+
+class StopTestCase(unittest.TestCase):
+    def test_stop(self):
+        """
+        Test if stop() wakes up waiting workers and remaining queued and
+        delayed tasks are passed to on_stop.
+        """
+        crawler = core.Crawler()
+        remaining = []
+        crawler.on_stop = remaining.extend
+
+        @crawler.handler(r'^retry$')
+        def retry_handler():
+            raise retry.Retry(60)
+
+        @crawler.handler(r'^stop$')
+        def stop_handler():
+            crawler.stop()
+            return ['next']
+
+        @crawler.handler(r'^next$')
+        def next_handler():
+            time.sleep(60)
+
+        start = time.monotonic()
+        crawler.start(['retry', 'stop'], count=4)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(sorted(task.url for task in remaining),
+                         ['next', 'retry'])
+
+    def test_restart(self):
+        """
+        Test if stopped or finished crawler processes all tasks when it's
+        started again.
+        """
+        crawler = core.Crawler()
+        crawler.queue = core.TaskQueue()
+        visited = []
+
+        @crawler.handler(r'^stop$')
+        def stop_handler():
+            crawler.stop(0)
+
+        @crawler.handler(r'^[ab]$')
+        def handler(url):
+            visited.append(url)
+
+        crawler.start(['stop'], count=2)
+        crawler.start(['a'], count=2)
+        crawler.start(['b'], count=2)
+        self.assertEqual(visited, ['a', 'b'])
+        self.assertFalse(crawler.client._interrupted.is_set())
+
+    def test_restart_timeout(self):
+        """
+        Test if crawler isn't started again while threads of the stopped
+        crawling are running.
+        """
+        crawler = core.Crawler()
+        crawler.restart_timeout = 0.05
+        evt = threading.Event()
+
+        @crawler.handler(r'.*')
+        def handler():
+            crawler.stop(0)
+            evt.wait(5)
+
+        crawler.start(['a'])
+        self.assertRaisesRegex(RuntimeError, 'still running',
+                               crawler.start, ['b'])
+        evt.set()
+        crawler.restart_timeout = 5
+        crawler.start([])
+
+    def test_deadline(self):
+        """
+        Test if start() doesn't wait for processed tasks after deadline.
+        """
+        crawler = core.Crawler()
+        crawler.handler(r'.*')(lambda: time.sleep(60))
+        threading.Timer(0.05, crawler.stop, (0.05,)).start()
+        start = time.monotonic()
+        crawler.start(['a'])
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_interrupt(self):
+        """
+        Test if request delay is interrupted.
+        """
+        client = core.Client(requests_delay=60)
+        threading.Timer(0.05, client.interrupt).start()
+        start = time.monotonic()
+        self.assertRaises(InterruptedError, client.get, 'http://a.com/')
+        self.assertLess(time.monotonic() - start, 5)
+
+
+class ClientTestCase(unittest.TestCase):
+    def test_shared_session(self):
+        """
+        Test if session is shared by all threads by default.
+        """
+        client = core.Client()
+        sessions = []
+        t = threading.Thread(target=lambda: sessions.append(client.session))
+        t.start()
+        t.join()
+        self.assertIs(sessions[0], client.session)
+
+    def test_thread_sessions(self):
+        """
+        Test if every thread has its own session sharing headers and cookies.
+        """
+        client = core.Client(headers={'X-Test': '1'}, thread_sessions=True)
+        sessions = []
+        t = threading.Thread(target=lambda: sessions.append(client.session))
+        t.start()
+        t.join()
+        self.assertIsNot(sessions[0], client.session)
+        self.assertIs(sessions[0], sessions[0])
+        self.assertIs(sessions[0].cookies, client.session.cookies)
+        self.assertEqual(sessions[0].headers['X-Test'], '1')
+
+    def test_resize_pool(self):
+        """
+        Test if connection pool is enlarged, but never shrunk.
+        """
+        client = core.Client(pool_maxsize=10)
+        client.resize_pool(64)
+        adapter = client.session.get_adapter('https://example.com/')
+        self.assertEqual(adapter._pool_maxsize, 64)
+        client.resize_pool(4)
+        self.assertEqual(client.pool_maxsize, 64)
+
+    def test_start_options(self):
+        """
+        Test if crawler sets up connection pooling of the client.
+        """
+        crawler = core.Crawler()
+        sessions = []
+        crawler.handler(r'.*')(lambda: sessions.append(crawler.client.session))
+        crawler.start(['a', 'b'], count=2, pool_maxsize=64,
+                      pool_connections=4, max_retries=3, keep_alive=False,
+                      thread_sessions=True)
+        self.assertEqual(len(sessions), 2)
+        adapter = sessions[0].get_adapter('https://example.com/')
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 64)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(sessions[0].headers['Connection'], 'close')
+        self.assertIsNot(sessions[0], crawler.client.session)
+        crawler.start([], keep_alive=True, thread_sessions=False)
+        self.assertIs(crawler.client.session, crawler.client.session)
+        self.assertNotIn('Connection', crawler.client.session.headers)
+
+
+def parse_items(url, body, encoding, data):
+    text = body.decode(encoding)
+    return ['{}/{}'.format(url, item) for item in text.split()
+            if item != data.get('skip')]
+
+
+class ParseHandlerTestCase(unittest.TestCase):
+    class DummyClient(core.Client):
+        def request(self, method, url):
+            response = requests.Response()
+            response.status_code = 404 if url.endswith('/x') else 200
+            response._content = 'a b č'.encode('utf-8')
+            response.encoding = 'utf-8'
+            return response
+
+    def test_parse(self):
+        """
+        Test if response body is parsed in the process pool and next tasks
+        are returned.
+        """
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            handler = core.ParseHandler(parse_items, r'^list$',
+                                        executor=executor)
+            t = core.Task('list', {'skip': 'b'}, handler=handler)
+            self.assertEqual(t.process(self.DummyClient()),
+                             ['list/a', 'list/č'])
+
+    def test_http_error(self):
+        """
+        Test if unsuccessful response is not parsed.
+        """
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            handler = core.ParseHandler(parse_items, r'', executor=executor)
+            t = core.Task('list/x', handler=handler)
+            self.assertRaises(requests.HTTPError, t.process,
+                              self.DummyClient())
+        self.assertRaises(TypeError, core.ParseHandler, parse_items, r'')
+
+    def test_process_pool(self):
+        """
+        Test if process pool created by the crawler is shut down after the
+        crawling and created again by the next one.
+        """
+        crawler = core.Crawler()
+        crawler.client = self.DummyClient()
+        crawler.parse_handler(r'^list$')(parse_items)
+        visited = []
+        crawler.handler(r'^list/')(lambda url: visited.append(url))
+        pools = []
+        for _ in range(2):
+            crawler.start([core.Task('list', {'skip': 'b'})])
+            pools.append(crawler.process_pool)
+            self.assertRaises(RuntimeError, crawler.process_pool.submit, int)
+        self.assertIsNot(pools[0], pools[1])
+        self.assertEqual(visited, ['list/a', 'list/č'] * 2)
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves FILES, supports Range requests if server.ranges is True."""
+
+    FILES = {'/file.bin': bytes(range(256)) * 1024,
+             '/page.html': b''.join(b'<a href="/item/%d">' % i
+                                    for i in range(1000))}
+    ETAG = '"v1"'
+
+    def do_GET(self):
+        self.server.requests += 1
+        content = self.FILES.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        if self.server.etag and \
+                self.headers.get('If-None-Match') == self.ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and self.server.ranges and if_range in (None, self.ETAG):
+            start = int(match.group(1))
+            self.server.range_requests += 1
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range',
+                                 'bytes */{}'.format(len(content)))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        if self.server.etag:
+            self.send_header('ETag', self.ETAG)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), RangeRequestHandler)
+        self.server.ranges = True
+        self.server.etag = True
+        self.server.requests = 0
+        self.server.range_requests = 0
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.client = core.Client(self.tmpdir.name)
+        self.content = RangeRequestHandler.FILES['/file.bin']
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def write_part(self, content, etag):
+        with open(self.client.file('file.bin.part'), 'wb') as f:
+            f.write(content)
+        if etag:
+            with open(self.client.file('file.bin.part.validators'), 'w') as f:
+                f.write(etag)
+
+    def read(self, filename):
+        with open(self.client.file(filename), 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        filename, size = self.client.download(self.url + 'file.bin',
+                                              preallocate=True)
+        self.assertEqual(filename, 'file.bin')
+        self.assertEqual(size, len(self.content))
+        self.assertEqual(self.read('file.bin'), self.content)
+        self.assertFalse(os.path.exists(self.client.file('file.bin.part')))
+
+    def test_metrics(self):
+        """
+        Test if requests and downloaded bytes are recorded to metrics.
+        """
+        self.client.metrics = metrics.Metrics()
+        self.client.download(self.url + 'file.bin')
+        host = utils.url_host(self.url)
+        self.assertEqual(self.client.metrics.get('requests_total', host=host,
+                                                 status=200), 1)
+        self.assertEqual(self.client.metrics.get('received_bytes_total'),
+                         len(self.content))
+
+    def test_links(self):
+        """
+        Test if links are extracted from streamed response.
+        """
+        self.client.metrics = metrics.Metrics()
+        links = self.client.links(self.url + 'page.html',
+                                  pattern=r'/item/\d*5$', chunk_size=100)
+        self.assertEqual(self.server.requests, 0)
+        self.assertEqual(list(links), [self.url + 'item/{}'.format(i)
+                                       for i in range(5, 1000, 10)])
+        self.assertEqual(self.client.metrics.get('received_bytes_total'),
+                         len(RangeRequestHandler.FILES['/page.html']))
+        with self.assertRaises(requests.HTTPError):
+            list(self.client.links(self.url + 'missing'))
+
+    def test_resume(self):
+        """
+        Test if partially downloaded file is resumed by range request, or
+        downloaded again if server doesn't support it.
+        """
+        for ranges in (True, False):
+            self.server.ranges = ranges
+            self.write_part(self.content[:1000], '"v1"')
+            self.client.download(self.url + 'file.bin')
+            self.assertEqual(self.read('file.bin'), self.content)
+            self.assertFalse(os.path.exists(
+                self.client.file('file.bin.part.validators')))
+        self.assertEqual(self.server.range_requests, 1)
+
+    def test_resume_changed(self):
+        """
+        Test if the file is downloaded again if it has changed or its
+        validators are unknown.
+        """
+        for etag in ('"v0"', None):
+            self.write_part(b'x' * 1000, etag)
+            self.client.download(self.url + 'file.bin')
+            self.assertEqual(self.read('file.bin'), self.content)
+        self.assertEqual(self.server.range_requests, 0)
+
+    def test_resume_complete(self):
+        """
+        Test if complete temporary file is renamed and too long one is
+        downloaded again.
+        """
+        for part in (self.content, self.content + b'x'):
+            self.write_part(part, '"v1"')
+            self.assertEqual(self.client.download(self.url + 'file.bin'),
+                             ('file.bin', len(self.content)))
+            self.assertEqual(self.read('file.bin'), self.content)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_manifest(self):
+        """
+        Test if downloaded files are not downloaded again.
+        """
+        self.client.manifest = manifest.DownloadManifest(
+            self.client.file('manifest.db'))
+        self.client.download(self.url + 'file.bin')
+        entry = self.client.manifest.get(self.url + 'file.bin')
+        self.assertEqual(entry.size, len(self.content))
+        self.assertEqual(entry.sha256,
+                         hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(entry.etag, '"v1"')
+
+        # Not modified.
+        os.utime(self.client.file('file.bin'), (0, 0))
+        self.assertEqual(self.client.download(self.url + 'file.bin'),
+                         ('file.bin', len(self.content)))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(os.stat(self.client.file('file.bin')).st_mtime, 0)
+
+        # Without validators file is not requested at all.
+        self.client.manifest.put(self.url + 'file.bin', 'file.bin',
+                                 len(self.content))
+        self.client.download(self.url + 'file.bin')
+        self.assertEqual(self.server.requests, 2)
+
+        # Changed file is downloaded again.
+        with open(self.client.file('file.bin'), 'wb') as f:
+            f.write(b'changed')
+        self.client.download(self.url + 'file.bin')
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.read('file.bin'), self.content)
+        self.client.manifest.close()
+
+    def test_failure(self):
+        """
+        Test if failed download doesn't create the file.
+        """
+        self.assertRaises(requests.HTTPError, self.client.download,
+                          self.url + 'missing.bin')
+        self.assertFalse(os.path.exists(self.client.file('missing.bin')))
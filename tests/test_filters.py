@@ -0,0 +1,173 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from logicoma import core, filters, utils
+
+
+class DuplicateFilterTestCase(unittest.TestCase):
+    def check_store(self, store):
+        f = filters.DuplicateFilter(store)
+        self.assertTrue(f(core.Task('https://example.com/?a=1&b=2')))
+        self.assertFalse(f(core.Task('https://EXAMPLE.com/?b=2&a=1#x')))
+        self.assertTrue(f(core.Task('https://example.com/?a=2')))
+        self.assertEqual(len(store), 2)
+
+    def test_memory(self):
+        self.check_store(filters.MemoryStore())
+
+    def test_invalid(self):
+        """
+        Test if URL which can't be normalized doesn't fail the whole batch.
+        """
+        crawler = core.Crawler()
+        crawler.handler(r'.*')(lambda: None)
+        crawler.queue_filter_chain.append(filters.DuplicateFilter())
+        urls = ['http://a.com/1', 'http://a.com:x/', 'http://[a.com/',
+                'http://h:80a/', 'http://a.com/1']
+        self.assertEqual(crawler.push_tasks(core.Task(url) for url in urls),
+                         4)
+
+    def test_bloom(self):
+        self.check_store(filters.BloomFilter(1000))
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'seen.db')
+            store = filters.SqliteStore(path)
+            self.check_store(store)
+            store.close()
+            # Seen URLs are kept after restart.
+            f = filters.DuplicateFilter(filters.SqliteStore(path))
+            self.assertFalse(f(core.Task('https://example.com/?a=2')))
+            f.close()
+
+    def test_concurrent(self):
+        """
+        Test if every URL passes exactly once when filter is called from
+        multiple threads.
+        """
+        f = filters.DuplicateFilter()
+        passed = []
+
+        def worker():
+            for i in range(1000):
+                if f(core.Task('https://example.com/{}'.format(i))):
+                    passed.append(i)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertCountEqual(passed, range(1000))
+
+
+class BloomFilterTestCase(unittest.TestCase):
+    def test_error_rate(self):
+        """
+        Test if false positive rate is about the configured rate.
+        """
+        bloom = filters.BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(str(i))
+        false_positives = sum(str(i) in bloom for i in range(10000, 20000))
+        self.assertLess(false_positives, 200)
+
+
+class URLFilterTestCase(unittest.TestCase):
+    def check(self, f, passed, filtered):
+        for url in passed:
+            self.assertTrue(f(core.Task(url)), url)
+        for url in filtered:
+            self.assertFalse(f(core.Task(url)), url)
+
+    def test_filters(self):
+        self.check(filters.SchemeFilter(),
+                   ['https://a.com/', 'HTTP://a.com/'],
+                   ['ftp://a.com/', 'mailto:x@a.com'])
+        self.check(filters.DomainFilter(['a.com', 'b.org']),
+                   ['https://a.com/', 'https://x.A.com:8080/', 'http://b.org'],
+                   ['https://ba.com/', 'https://a.com.evil/', '/relative'])
+        self.check(filters.DomainFilter(['a.com'], exclude=True),
+                   ['https://b.com/'], ['https://x.a.com/'])
+        self.check(filters.ExtensionFilter(['.jpg', 'PDF'], exclude=True),
+                   ['https://a.com/x.html', 'https://a.com/x.jpg/', 'x?a.jpg'],
+                   ['https://a.com/X.JPG', 'https://a.com/d/x.pdf?a=1'])
+        self.check(filters.ExtensionFilter(['.html', '']),
+                   ['https://a.com/', 'https://a.com/x.html'],
+                   ['https://a.com/x.zip'])
+        self.check(filters.RegexFilter([r'/item/\d+$', r'/page/']),
+                   ['https://a.com/item/1', 'https://a.com/page/x'],
+                   ['https://a.com/item/x'])
+        task = core.Task('https://a.com/')
+        task.depth = 3
+        self.assertTrue(filters.DepthFilter(3)(task))
+        self.assertFalse(filters.DepthFilter(2)(task))
+
+    def test_chain(self):
+        """
+        Test if declarative filters are checked first, cheapest first, and
+        compiled chain is updated when chain changes.
+        """
+        calls = []
+
+        class Filter(filters.URLFilter):
+            def __init__(self, name, cost):
+                self.name = name
+                self.cost = cost
+
+            def check_url(self, task, parts):
+                calls.append(self.name)
+                return True
+
+        chain = utils.FilterChain()
+        chain.append(lambda task: calls.append('func') or True)
+        chain.append(Filter('regex', 3))
+        chain.append(Filter('depth', 0))
+        self.assertTrue(chain(core.Task('https://a.com/')))
+        self.assertEqual(calls, ['depth', 'regex', 'func'])
+        chain.append(filters.DomainFilter(['b.com']))
+        self.assertFalse(chain(core.Task('https://a.com/')))
+        del chain[-1]
+        self.assertTrue(chain(core.Task('https://a.com/')))
+
+    def test_batch(self):
+        """
+        Test if batch filtering passes the same tasks as filtering task by
+        task, including duplicates in the batch.
+        """
+        def make_chain():
+            chain = utils.FilterChain()
+            chain.append(filters.DuplicateFilter())
+            chain.append(lambda task: not task.url.endswith('/3'))
+            chain.extend([filters.SchemeFilter(),
+                          filters.DomainFilter(['a.com']),
+                          filters.ExtensionFilter(['.jpg'], exclude=True)])
+            return chain
+        urls = ['https://a.com/{}'.format(i) for i in range(5)] + [
+            'https://a.com/1', 'ftp://a.com/5', 'https://b.com/6',
+            'https://a.com/7.jpg', 'https://a.com/8']
+        chain = make_chain()
+        expected = [url for url in urls if chain(core.Task(url))]
+        passed = make_chain().filter(core.Task(url) for url in urls)
+        self.assertEqual([task.url for task in passed], expected)
+        self.assertEqual(expected, ['https://a.com/0', 'https://a.com/1',
+                                    'https://a.com/2', 'https://a.com/4',
+                                    'https://a.com/8'])
+
+    def test_depth(self):
+        """
+        Test if depth of tasks returned by handlers is limited.
+        """
+        crawler = core.Crawler()
+        crawler.queue_filter_chain.append(filters.DepthFilter(2))
+        depths = []
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            depths.append(int(url))
+            return [str(int(url) + 1)]
+
+        crawler.start(['0'])
+        self.assertEqual(depths, [0, 1, 2])
@@ -0,0 +1,110 @@
+import unittest
+import urllib.request
+
+import logicoma
+from logicoma import metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_record(self):
+        """
+        Test recording of counters, gauges and histograms and hooks.
+        """
+        m = metrics.Metrics()
+        events = []
+        m.hooks.append(lambda *args: events.append(args))
+        m.inc('tasks_total', status='finished')
+        m.inc('tasks_total', 2, status='finished')
+        m.set('workers', 4)
+        m.add('workers_busy', 1)
+        m.gauge_func('queue_depth', lambda: 7)
+        m.observe('handler_seconds', 0.02, handler='a')
+        m.observe('handler_seconds', 3, handler='a')
+        self.assertEqual(m.get('tasks_total', status='finished'), 3)
+        self.assertEqual(m.get('workers'), 4)
+        self.assertEqual(m.get('queue_depth'), 7)
+        self.assertIsNone(m.get('tasks_total'))
+        snapshot = m.snapshot()
+        h = snapshot['histograms'][('handler_seconds', (('handler', 'a'),))]
+        self.assertEqual(h['count'], 2)
+        self.assertEqual(h['buckets'][-1], (float('inf'), 2))
+        self.assertEqual(dict(h['buckets'])[0.025], 1)
+        self.assertEqual(snapshot['gauges'][('queue_depth', ())], 7)
+        self.assertEqual(len(events), 6)
+        self.assertEqual(events[0],
+                         ('counter', 'tasks_total', 1, {'status': 'finished'}))
+
+    def test_prometheus(self):
+        """
+        Test Prometheus text format and its HTTP server.
+        """
+        m = metrics.Metrics()
+        m.inc('requests_total', host='a"b', status=200)
+        m.observe('request_seconds', 0.1, host='a')
+        text = m.prometheus()
+        self.assertIn('# TYPE logicoma_requests_total counter', text)
+        self.assertIn('logicoma_requests_total{host="a\\"b",status="200"} 1',
+                      text)
+        self.assertIn('logicoma_request_seconds_bucket{host="a",le="+Inf"} 1',
+                      text)
+        self.assertIn('logicoma_request_seconds_count{host="a"} 1', text)
+        # URL without host.
+        m.inc('requests_total', host=None, status=200)
+        m.observe('request_seconds', 0.1, host=None)
+        self.assertIn('logicoma_requests_total{host="None",status="200"} 1',
+                      m.prometheus())
+
+        server = metrics.MetricsServer(m, port=0).start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.port)
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(response.read().decode(), m.prometheus())
+        finally:
+            server.stop()
+
+    def test_crawler(self):
+        """
+        Test metrics recorded by the crawler.
+        """
+        crawler = logicoma.Crawler()
+
+        @crawler.handler(r'ok')
+        def ok(url):
+            return ['fail'] if url == 'ok/1' else []
+
+        @crawler.handler(r'fail')
+        def fail(url):
+            raise ValueError(url)
+
+        crawler.start(['ok/1', 'ok/2'])
+        m = crawler.metrics
+        self.assertEqual(m.get('tasks_enqueued_total'), 3)
+        self.assertEqual(m.get('tasks_dequeued_total'), 3)
+        self.assertEqual(m.get('tasks_total', handler=ok.__qualname__,
+                               status='finished'), 2)
+        self.assertEqual(m.get('tasks_total', handler=fail.__qualname__,
+                               status='failed'), 1)
+        self.assertEqual(m.get('workers'), 1)
+        self.assertEqual(m.get('workers_busy'), 0)
+        self.assertEqual(m.get('queue_depth'), 0)
+        self.assertIs(crawler.client.metrics, m)
+
+    def test_progress(self):
+        """
+        Test if progress is reported by summaries instead of per task logs.
+        """
+        crawler = logicoma.Crawler()
+        crawler.progress = metrics.ProgressReporter(crawler.metrics, 60)
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            return []
+
+        with self.assertLogs('logicoma', 'INFO') as logs:
+            crawler.start(['a', 'b', 'c'])
+        self.assertEqual(len(logs.records), 1)
+        progress = logs.records[0].progress
+        self.assertEqual(progress['enqueued'], 3)
+        self.assertEqual(progress['finished'], 3)
+        self.assertEqual(progress['failed'], 0)
+        self.assertEqual(progress['queue_depth'], 0)
@@ -0,0 +1,103 @@
+import unittest
+
+import bs4
+
+from logicoma import parsing
+
+HTML = '<html><body><p>text</p><a href="/a">A</a><a href="/b">B</a></body>'
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_parsers(self):
+        for parser in ('html5lib', 'html.parser'):
+            page = parsing.parse(HTML, parser)
+            self.assertEqual([a['href'] for a in page.find_all('a')],
+                             ['/a', '/b'])
+
+    def test_parse_only(self):
+        page = parsing.parse(HTML, 'html.parser',
+                             parse_only=bs4.SoupStrainer('a'))
+        self.assertIsNone(page.find('p'))
+        self.assertEqual(len(page.find_all('a')), 2)
+
+
+class LazyPageTestCase(unittest.TestCase):
+    def test_lazy(self):
+        """
+        Test if page is parsed on the first access.
+        """
+        page = parsing.LazyPage(HTML, 'html.parser')
+        self.assertFalse(page.parsed)
+        self.assertEqual(page.find('p').text, 'text')
+        self.assertTrue(page.parsed)
+        self.assertEqual(len(page('a')), 2)
+
+
+class PageCacheTestCase(unittest.TestCase):
+    def test_cache(self):
+        """
+        Test if identical pages are parsed once and cache is bounded.
+        """
+        cache = parsing.PageCache(maxsize=2)
+        page = cache.parse(HTML, 'html.parser')
+        self.assertIs(cache.parse(HTML, 'html.parser'), page)
+        self.assertIsNot(cache.parse(HTML, 'html5lib'), page)
+        cache.parse(HTML + ' ', 'html.parser')
+        self.assertIsNot(cache.parse(HTML, 'html.parser'), page)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        self.assertEqual(len(cache), 2)
+
+    def test_lazy(self):
+        cache = parsing.PageCache()
+        page = parsing.LazyPage(HTML, 'html.parser', cache=cache)
+        document = page.document
+        page = parsing.LazyPage(HTML, 'html.parser', cache=cache)
+        self.assertIs(page.document, document)
+
+
+class LinkExtractorTestCase(unittest.TestCase):
+    PAGE = ('<html><head><meta charset="iso-8859-2"><base href="/dir/">'
+            '<base href="/other/"></head><body>'
+            '<a href="a.html#top">A</a><a href=" ../b?y=2&amp;x=1 ">B</a>'
+            '<a href="mailto:x@example.com">mail</a><a>none</a>'
+            '<script>var s = "<a href=\'/script\'>";</script>'
+            '<area href="HTTPS://Example.COM:443/c"><img src="/i.png">'
+            '<a href="/ž">ž</a></body></html>')
+
+    def extract(self, chunk_size, **kwargs):
+        data = self.PAGE.encode('iso-8859-2')
+        chunks = [data[i:i + chunk_size]
+                  for i in range(0, len(data), chunk_size)]
+        return list(parsing.extract_links(chunks, 'http://example.com/x/y',
+                                          **kwargs))
+
+    def test_links(self):
+        """
+        Test if links are resolved against <base>, normalized and found in
+        pages fed by chunks of any size.
+        """
+        expected = ['http://example.com/dir/a.html',
+                    'http://example.com/b?x=1&y=2',
+                    'https://example.com/c',
+                    'http://example.com/ž']
+        for chunk_size in (1, 7, 100000):
+            self.assertEqual(self.extract(chunk_size), expected)
+
+    def test_filter(self):
+        self.assertEqual(self.extract(50, selector='img[src], a[href]',
+                                      pattern=r'\.(png|html)$'),
+                         ['http://example.com/dir/a.html',
+                          'http://example.com/i.png'])
+        self.assertEqual(self.extract(50, selector='*[src]'),
+                         ['http://example.com/i.png'])
+        with self.assertRaises(ValueError):
+            self.extract(50, selector='a.link')
+
+    def test_malformed(self):
+        """
+        Test if malformed links are skipped and extraction continues.
+        """
+        data = (b'<base href="http://[x/"><a href="http://[bad/">'
+                b'<a href="http://h:80a/x"><a href="/ok">')
+        self.assertEqual(list(parsing.extract_links([data], 'http://e.com/')),
+                         ['http://h:80a/x', 'http://e.com/ok'])
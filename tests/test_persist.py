@@ -0,0 +1,304 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from logicoma import core, metrics, persist, retry, tasks
+
+
+def handler(url, data):
+    pass
+
+
+HANDLER = core.Handler(handler, r'.*')
+
+
+class PersistentTaskQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'queue.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resume(self):
+        """
+        Test if tasks queued by interrupted crawler are processed after
+        resume and starter is not called.
+        """
+        crawler = core.Crawler()
+        crawler.handler(r'//a\.com/')(handler)
+        crawler.queue = persist.PersistentTaskQueue(self.path)
+        crawler.push_task(core.Task('https://a.com/1', {'x': 1}, priority=2))
+        crawler.push_task(core.Task('https://a.com/2'))
+        crawler.push_task(tasks.Download('https://b.com/f.zip', retry=3,
+                                         priority=5))
+        crawler.queue.close()
+
+        visited = []
+        crawler = core.Crawler(lambda: self.fail('starter called'))
+        crawler.handler(r'//a\.com/')(lambda url, data: visited.append(
+            (url, data)))
+        crawler.queue = persist.PersistentTaskQueue(self.path)
+        crawler.push_task(core.Task('https://a.com/3'))
+        # Remove download from the store, so it's not processed.
+        (id, download), = [(id, task)
+                           for id, task in crawler.queue.store.tasks()
+                           if isinstance(task, tasks.Download)]
+        self.assertEqual(download.retry, 3)
+        crawler.queue.store.remove(id)
+        crawler.start(resume=True)
+        self.assertEqual(visited, [('https://a.com/1', {'x': 1}),
+                                   ('https://a.com/2', {}),
+                                   ('https://a.com/3', {})])
+        self.assertEqual(len(crawler.queue.store), 0)
+
+    def test_stop(self):
+        """
+        Test if delayed retries of stopped crawler are stored and resumed.
+        """
+        crawler = core.Crawler()
+        crawler.queue = persist.PersistentTaskQueue(self.path)
+
+        @crawler.handler(r'.*')
+        def retry_handler(url):
+            crawler.stop()
+            raise retry.Retry(60)
+
+        crawler.start(['https://a.com/'])
+        crawler.queue.close()
+
+        visited = []
+        crawler = core.Crawler()
+        crawler.handler(r'.*')(lambda url: visited.append(url))
+        crawler.queue = persist.PersistentTaskQueue(self.path)
+        crawler.start(resume=True)
+        self.assertEqual(visited, ['https://a.com/'])
+
+    def test_defer(self):
+        """
+        Test if deferred task is kept in the store until it's put again.
+        """
+        q = persist.PersistentTaskQueue(self.path, batch_size=1)
+        q.put(core.Task('a'))
+        task = q.get()
+        task.attempt = 1
+        q.defer(task)
+        q.task_done()
+        self.assertEqual([(t.url, t.attempt) for _, t in q.store.tasks()],
+                         [('a', 1)])
+        q.put(task, False)
+        self.assertEqual(len(q.store), 1)
+        q.get()
+        q.task_done()
+        self.assertEqual(len(q.store), 0)
+        q.close()
+
+    def test_retry(self):
+        """
+        Test if task waiting for retry is restored after crash.
+        """
+        crawler = core.Crawler()
+        crawler.queue = persist.PersistentTaskQueue(self.path, batch_size=1)
+
+        @crawler.handler(r'.*')
+        def retry_handler(url):
+            raise retry.Retry(60)
+
+        crawler.push_task(core.Task('https://a.com/'))
+        thread = threading.Thread(target=crawler.start, args=([],),
+                                  daemon=True)
+        thread.start()
+        for _ in range(500):
+            if crawler.delayed:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(crawler.delayed), 1)
+
+        # Crash during the delay.
+        queue = persist.PersistentTaskQueue(self.path)
+        self.assertEqual(queue.restore(crawler.handler_list), 1)
+        task = queue.get(block=False)
+        self.assertEqual((task.url, task.attempt), ('https://a.com/', 1))
+        crawler.stop()
+        thread.join(5)
+        crawler.queue.close()
+        queue.close()
+
+    def test_put_many(self):
+        """
+        Test if batch of tasks is stored and removed when it's done.
+        """
+        q = persist.PersistentTaskQueue(self.path)
+        q.put_many([core.Task('a'), core.Stop(), core.Task('b')])
+        self.assertEqual([task.url for _, task in q.store.tasks()],
+                         ['a', 'b'])
+        for _ in range(3):
+            q.get()
+            q.task_done()
+        self.assertEqual(len(q.store), 0)
+        q.close()
+
+    def test_handler_identity(self):
+        """
+        Test if task handler is restored by its identity.
+        """
+        crawler = core.Crawler()
+        crawler.handler(r'.*', priority=1)(lambda: None)
+        crawler.handler(r'.*')(handler)
+        queue = persist.PersistentTaskQueue(self.path)
+        queue.put(core.Task('https://a.com/',
+                            handler=crawler.handler_list.handlers[1]))
+        queue.close()
+
+        queue = persist.PersistentTaskQueue(self.path)
+        queue.restore(crawler.handler_list)
+        self.assertIs(queue.get().handler.func, handler)
+
+
+class SpillTestCase(unittest.TestCase):
+    def test_spill(self):
+        """
+        Test if tasks over the limit are spilled to the store and returned
+        back in the correct order.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = persist.TaskStore(os.path.join(tmpdir, 'spill.db'))
+            q = core.TaskQueue(maxsize=4, spill=store)
+            tasks = [core.Task(str(i), handler=HANDLER, priority=i % 2)
+                     for i in range(20)]
+            for t in tasks:
+                q.put(t, block=False)
+            self.assertEqual(q.qsize(), 4)
+            self.assertEqual(len(store), 16)
+            urls = [q.get().url for _ in tasks]
+            self.assertEqual(urls, [str(i) for i in range(1, 20, 2)] +
+                                   [str(i) for i in range(0, 20, 2)])
+            self.assertEqual(len(store), 0)
+            store.close()
+
+    def test_state(self):
+        """
+        Test if spilled tasks keep their handler, retries and depth, tasks
+        with handler which can't be stored are not spilled.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = persist.TaskStore(os.path.join(tmpdir, 'spill.db'))
+            store.handler_list = core.HandlerList([HANDLER])
+            q = core.TaskQueue(maxsize=1, spill=store)
+            q.put(core.Task('first', handler=HANDLER), block=False)
+            spilled = core.Task('spilled', handler=HANDLER)
+            spilled.attempt = 2
+            spilled.depth = 3
+            q.put(spilled, block=False)
+            q.put(core.Task('callable', handler=handler), block=False)
+            q.put(tasks.Download('download', retry=1), block=False)
+            self.assertEqual(len(store), 2)
+            got = {task.url: task for task in (q.get() for _ in range(4))}
+            self.assertIs(got['callable'].handler, handler)
+            self.assertIs(got['spilled'].handler, HANDLER)
+            self.assertEqual((got['spilled'].attempt, got['spilled'].depth),
+                             (2, 3))
+            self.assertEqual(got['download'].retry, 1)
+            self.assertEqual(got['download'].handler,
+                             got['download'].download)
+            store.close()
+
+    def test_stop(self):
+        """
+        Test if spilled tasks are passed to on_stop.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            crawler = core.Crawler()
+            store = persist.TaskStore(os.path.join(tmpdir, 'spill.db'))
+            crawler.queue = core.TaskQueue(maxsize=5, spill=store)
+            remaining = []
+            crawler.on_stop = remaining.extend
+
+            @crawler.handler(r'^root$')
+            def root_handler():
+                crawler.stop()
+                return ['child/{}'.format(i) for i in range(50)]
+
+            crawler.handler(r'^child/')(handler)
+            crawler.start(['root'])
+            self.assertEqual(sorted(task.url for task in remaining),
+                             sorted('child/{}'.format(i) for i in range(50)))
+            self.assertTrue(all(task.handler.func is handler
+                                for task in remaining))
+            store.close()
+
+    def test_old_store(self):
+        """
+        Test if store created without attempt and depth columns is updated.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'spill.db')
+            db = sqlite3.connect(path)
+            db.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY, url TEXT, '
+                       'data BLOB, priority INTEGER, handler TEXT, '
+                       'retry INTEGER, class TEXT)')
+            db.execute("INSERT INTO tasks VALUES (1, 'a', NULL, 0, NULL, 0, "
+                       "'logicoma.core.Task')")
+            db.commit()
+            db.close()
+            store = persist.TaskStore(path)
+            task = core.Task('b')
+            task.depth = 2
+            store.add(2, task)
+            self.assertEqual([(t.url, t.depth) for _, t in store.tasks()],
+                             [('a', 0), ('b', 2)])
+            store.close()
+
+    def test_metrics(self):
+        """
+        Test if spilling while metrics are read doesn't deadlock, gauge of
+        the queue depth takes the queue lock.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = persist.TaskStore(os.path.join(tmpdir, 'spill.db'))
+            q = core.TaskQueue(maxsize=1, spill=store)
+            q.metrics = metrics.Metrics()
+            q.metrics.gauge_func('queue_depth', q.qsize)
+            done = threading.Event()
+
+            def reader():
+                while not done.is_set():
+                    q.metrics.snapshot()
+                    q.metrics.get('queue_depth')
+            thread = threading.Thread(target=reader, daemon=True)
+            thread.start()
+            for i in range(2000):
+                q.put(core.Task(str(i), handler=HANDLER), block=False)
+                q.put_many([core.Task(str(i), handler=HANDLER)])
+            done.set()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(q.metrics.get('tasks_spilled_total'), 3999)
+            store.close()
+
+    def test_bounded_starter(self):
+        """
+        Test if starter is iterated lazily when the queue is full.
+        """
+        crawler = core.Crawler()
+        crawler.queue = core.TaskQueue(maxsize=2)
+        pulled = []
+        processed = []
+
+        @crawler.starter()
+        def starter():
+            for i in range(50):
+                pulled.append(i)
+                yield str(i)
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            # Starter never runs far ahead of workers.
+            self.assertLessEqual(len(pulled) - len(processed), 4)
+            processed.append(url)
+
+        crawler.start()
+        self.assertEqual(len(processed), 50)
@@ -0,0 +1,94 @@
+import unittest
+
+import requests
+
+from logicoma import aio, core, retry
+
+
+def http_error(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def test_retryable(self):
+        policy = retry.RetryPolicy()
+        self.assertTrue(policy.retryable(http_error(503)))
+        self.assertFalse(policy.retryable(http_error(404)))
+        self.assertTrue(policy.retryable(requests.ConnectionError()))
+        self.assertFalse(policy.retryable(ValueError()))
+
+    def test_delay(self):
+        """
+        Test exponential backoff, jitter and Retry-After.
+        """
+        policy = retry.RetryPolicy(backoff=1, factor=2, max_delay=5,
+                                   jitter=0)
+        self.assertEqual([policy.delay(i) for i in range(4)], [1, 2, 4, 5])
+        self.assertEqual(policy.delay(0, http_error(429, {'Retry-After': 3})),
+                         3)
+        policy.jitter = 0.5
+        for _ in range(100):
+            self.assertTrue(2 <= policy.delay(2) <= 4)
+
+
+class RetryTestCase(unittest.TestCase):
+    def make_crawler(self, crawler):
+        """
+        Register handler which fails twice on URL 'fail', order of processed
+        URLs is stored to `self.processed`.
+        """
+        self.processed = []
+        crawler.retry = retry.RetryPolicy(backoff=0.05, jitter=0)
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            self.processed.append(url)
+            if url == 'fail' and self.processed.count(url) < 3:
+                raise requests.ConnectionError(url)
+            if url == 'explicit' and self.processed.count(url) < 2:
+                raise retry.Retry(0.01)
+            if url == 'invalid':
+                raise ValueError(url)
+
+        return crawler
+
+    def check(self, crawler):
+        crawler.start(['fail', 'explicit', 'invalid', 'ok'])
+        self.assertEqual(self.processed[:4],
+                         ['fail', 'explicit', 'invalid', 'ok'])
+        self.assertEqual(self.processed[4:],
+                         ['explicit', 'fail', 'fail'])
+        self.assertEqual(crawler.metrics.total('tasks_total',
+                                               status='retried'), 3)
+        self.assertEqual(crawler.metrics.total('tasks_total',
+                                               status='failed'), 1)
+
+    def test_crawler(self):
+        """
+        Test if failed tasks are retried later without blocking other tasks,
+        and crawler waits for them.
+        """
+        self.check(self.make_crawler(core.Crawler()))
+
+    def test_async_crawler(self):
+        self.check(self.make_crawler(aio.AsyncCrawler()))
+
+    def test_handler_policy(self):
+        """
+        Test if policy of the handler is used instead of the crawler's one.
+        """
+        crawler = core.Crawler()
+        crawler.retry = retry.RetryPolicy(retries=5, backoff=0.01)
+        processed = []
+
+        @crawler.handler(r'.*', retry=retry.RetryPolicy(retries=1,
+                                                        backoff=0.01))
+        def handler(url):
+            processed.append(url)
+            raise requests.Timeout()
+
+        crawler.start(['a'])
+        self.assertEqual(processed, ['a', 'a'])
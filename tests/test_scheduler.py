@@ -0,0 +1,270 @@
+import queue
+import threading
+import time
+import unittest
+
+import requests
+
+from logicoma import core, scheduler
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_burst(self):
+        """
+        Test if burst of requests is allowed and then requests are delayed.
+        """
+        bucket = scheduler.TokenBucket(rate=2, burst=2)
+        now = bucket.timestamp
+        for _ in range(2):
+            self.assertEqual(bucket.delay(now), 0)
+            bucket.consume(now)
+        self.assertAlmostEqual(bucket.delay(now), 0.5)
+        self.assertEqual(bucket.delay(now + 0.5), 0)
+
+    def test_unlimited(self):
+        bucket = scheduler.TokenBucket()
+        for _ in range(100):
+            bucket.consume()
+        self.assertEqual(bucket.delay(), 0)
+
+
+class HostQueueTestCase(unittest.TestCase):
+    def test_ready_host(self):
+        """
+        Test if task of other host is returned when host with higher priority
+        task can't be requested yet, and Stop waits for it.
+        """
+        q = scheduler.HostQueue(scheduler.Throttle(hosts={'a.com': 0.01}))
+        q.put(core.Task('http://a.com/1', priority=1))
+        q.put(core.Task('http://a.com/2', priority=1))
+        q.put(core.Task('http://b.com/1'))
+        q.put(core.Stop())
+        self.assertEqual(q.get().url, 'http://a.com/1')
+        self.assertEqual(q.get().url, 'http://b.com/1')
+        self.assertRaises(queue.Empty, q.get, block=False)
+        self.assertRaises(queue.Empty, q.get, timeout=0.01)
+        self.assertEqual(q.qsize(), 2)
+        q.put(core.Abort())
+        self.assertIsInstance(q.get(block=False), core.Abort)
+
+    def test_soft_limit(self):
+        """
+        Test if non-blocking put exceeds the limit of bounded queue.
+        """
+        q = scheduler.HostQueue(maxsize=1)
+        q.put(core.Task('http://a.com/1'))
+        q.put(core.Task('http://b.com/1'), False)
+        self.assertEqual(q.qsize(), 2)
+        with self.assertRaises(queue.Full):
+            q.put(core.Task('http://c.com/1'), timeout=0.01)
+
+    def test_order(self):
+        """
+        Test if tasks are returned by priority and order of their addition.
+        """
+        q = scheduler.HostQueue()
+        tasks = [core.Task('http://{}.com/{}'.format(host, i), priority=i % 3)
+                 for i in range(30) for host in 'abc']
+        for t in tasks:
+            q.put(t)
+        correct_order = sorted(tasks, key=lambda t: -t.priority)
+        for a in correct_order:
+            self.assertIs(q.get(), a)
+
+    def test_handler_delay(self):
+        """
+        Test if handler delay postpones next request to the same host.
+        """
+        handler = core.Handler(lambda: None, r'', delay=60)
+        q = scheduler.HostQueue()
+        q.put(core.Task('http://a.com/1', handler=handler))
+        q.put(core.Task('http://a.com/2', handler=handler))
+        q.get()
+        self.assertRaises(queue.Empty, q.get, block=False)
+
+    def test_next_task(self):
+        """
+        Test if waiting host is ready when its next task is not delayed.
+        """
+        handler = core.Handler(lambda: None, r'', delay=60)
+        q = scheduler.HostQueue()
+        q.put(core.Task('http://a.com/1', handler=handler))
+        q.put(core.Task('http://a.com/2', handler=handler))
+        q.get()
+        q.put(core.Task('http://a.com/3', priority=1))
+        self.assertEqual(q.get(block=False).url, 'http://a.com/3')
+        self.assertRaises(queue.Empty, q.get, block=False)
+        self.assertEqual(q.qsize(), 1)
+
+    def test_max_active(self):
+        """
+        Test if number of processed tasks of one host is limited until the
+        task is done.
+        """
+        q = scheduler.HostQueue(max_active=1)
+        q.put(core.Task('http://a.com/1', priority=1))
+        q.put(core.Task('http://a.com/2', priority=1))
+        q.put(core.Task('http://b.com/1'))
+        self.assertEqual(q.get().url, 'http://a.com/1')
+        urls = []
+        got = threading.Event()
+
+        def worker():
+            urls.append(q.get().url)
+            got.set()
+            urls.append(q.get(timeout=5).url)
+
+        t = threading.Thread(target=worker)
+        t.start()
+        got.wait(5)
+        self.assertRaises(queue.Empty, q.get, block=False)
+        q.task_done()
+        t.join()
+        self.assertEqual(urls, ['http://b.com/1', 'http://a.com/2'])
+
+
+class RoundRobinQueueTestCase(unittest.TestCase):
+    def test_round_robin(self):
+        """
+        Test if hosts take turns and Stop is returned after all tasks.
+        """
+        q = scheduler.RoundRobinQueue()
+        q.put(core.Stop())
+        for i in range(4):
+            q.put(core.Task('http://a.com/{}'.format(i)))
+        for host in 'bc':
+            q.put(core.Task('http://{}.com/0'.format(host)))
+        urls = [q.get().url for _ in range(6)]
+        self.assertEqual(urls, ['http://a.com/0', 'http://b.com/0',
+                                'http://c.com/0', 'http://a.com/1',
+                                'http://a.com/2', 'http://a.com/3'])
+        self.assertIsInstance(q.get(), core.Stop)
+
+    def test_weight(self):
+        """
+        Test if host with higher priority tasks gets more turns.
+        """
+        q = scheduler.RoundRobinQueue()
+        for i in range(10):
+            q.put(core.Task('http://a.com/{}'.format(i), priority=1))
+            q.put(core.Task('http://b.com/{}'.format(i)))
+        hosts = [q.get().url[7] for _ in range(9)]
+        self.assertEqual(hosts.count('a'), 6)
+        self.assertEqual(hosts.count('b'), 3)
+
+    def test_abort(self):
+        """
+        Test if Abort is returned before other tasks.
+        """
+        q = scheduler.RoundRobinQueue()
+        q.put(core.Task('http://a.com/'))
+        q.put(core.Abort())
+        self.assertIsInstance(q.get(), core.Abort)
+
+    def test_stop_waiting(self):
+        """
+        Test if Stop isn't returned before tasks of waiting host.
+        """
+        q = scheduler.RoundRobinQueue(scheduler.Throttle(hosts={'a.com': 10}))
+        q.put(core.Task('http://a.com/1'))
+        q.put(core.Task('http://a.com/2'))
+        q.put(core.Stop())
+        self.assertEqual(q.get().url, 'http://a.com/1')
+        self.assertRaises(queue.Empty, q.get, block=False)
+        self.assertEqual(q.get(timeout=5).url, 'http://a.com/2')
+        self.assertIsInstance(q.get(block=False), core.Stop)
+
+    def test_crawler(self):
+        """
+        Test crawling with per-host limit of processed tasks.
+        """
+        crawler = core.Crawler()
+        crawler.queue = scheduler.RoundRobinQueue(max_active=1)
+        urls = []
+
+        @crawler.handler(r'.*')
+        def handler(url):
+            urls.append(url)
+
+        crawler.start(['http://{}.com/{}'.format(host, i)
+                       for host in 'ab' for i in range(3)], count=2)
+        self.assertEqual(sorted(urls), sorted(
+            'http://{}.com/{}'.format(host, i)
+            for host in 'ab' for i in range(3)))
+
+
+def make_response(status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+class AdaptiveLimitTestCase(unittest.TestCase):
+    def test_aimd(self):
+        """
+        Test if limit is increased by successful requests and halved once
+        by overloaded requests which were in flight together.
+        """
+        limit = scheduler.AdaptiveLimit(min=1, max=4)
+        for expected in (2, 3, 4, 4):
+            for _ in range(limit.limit):
+                limit.release(limit.acquire(), make_response())
+            self.assertEqual(limit.limit, expected)
+        starts = [limit.acquire() for _ in range(4)]
+        self.assertEqual(limit.in_flight, 4)
+        for start in starts:
+            limit.release(start, make_response(429))
+        self.assertEqual(limit.limit, 2)
+        limit.release(limit.acquire(), error=requests.Timeout())
+        self.assertEqual(limit.limit, 1)
+        limit.release(limit.acquire(), error=ValueError())
+        self.assertEqual(limit.limit, 1)
+
+    def test_retry_after(self):
+        """
+        Test if requests are not started before Retry-After.
+        """
+        limit = scheduler.AdaptiveLimit(initial=2)
+        limit.release(limit.acquire(),
+                      make_response(503, {'Retry-After': '0.1'}))
+        start = time.monotonic()
+        limit.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_client(self):
+        """
+        Test if client limits concurrent requests.
+        """
+        client = core.Client(limiter=scheduler.AdaptiveLimit(max=2))
+        client.session.request = lambda *args, **kwargs: make_response(429)
+        client.get('http://a.com/')
+        self.assertEqual(client.limiter.in_flight, 0)
+        self.assertEqual(client.limiter.limit, 1)
+
+
+class DelayedTasksTestCase(unittest.TestCase):
+    def test_push_error(self):
+        """
+        Test if task whose push failed is pushed again and following tasks
+        are still pushed.
+        """
+        pushed = []
+        failures = [queue.Full()]
+
+        def push(task):
+            if failures:
+                raise failures.pop()
+            pushed.append(task.url)
+
+        delayed = scheduler.DelayedTasks(push)
+        delayed.RETRY_DELAY = 0.05
+        with self.assertLogs('logicoma', 'WARNING'):
+            delayed.add(core.Task('a'), 0)
+            delayed.add(core.Task('b'), 0.01)
+            deadline = time.monotonic() + 5
+            while len(pushed) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        delayed.close()
+        self.assertEqual(pushed, ['b', 'a'])
+        self.assertEqual(len(delayed), 0)
@@ -1,4 +1,7 @@
 import unittest
+import urllib.parse
+
+import requests
 
 from logicoma import utils
 
@@ -16,3 +19,31 @@ class FilterChainTestCase:
         self.assertFalse(fc(1))
         self.assertTrue(fc(2))
         self.assertTrue(fc(4))
+
+
+class UrlTestCase(unittest.TestCase):
+    def test_url_normalize(self):
+        self.assertEqual(utils.url_normalize('HTTPS://Ex.COM:443?b=2&a=1#x'),
+                         'https://ex.com/?a=1&b=2')
+        self.assertEqual(utils.url_normalize('http://u:P@Ex.com:8080/a'),
+                         'http://u:P@ex.com:8080/a')
+        self.assertEqual(utils.url_normalize('http://H:80a/'), 'http://h:80a/')
+
+    def test_url_split(self):
+        for url in ['HTTPS://u@Ex.com:8080/a/b.html?q=1#f', '/a?b', '',
+                    'mailto:x@ex.com', '//ex.com', 'a.jpg?x#y']:
+            self.assertEqual(utils.url_split(url),
+                             urllib.parse.urlsplit(url))
+
+    def test_url_host(self):
+        self.assertEqual(utils.url_host('https://Ex.com:8080/a'), 'ex.com')
+
+    def test_retry_after(self):
+        response = requests.Response()
+        self.assertIsNone(utils.retry_after(response))
+        response.headers['Retry-After'] = '120'
+        self.assertEqual(utils.retry_after(response), 120)
+        response.headers['Retry-After'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.assertEqual(utils.retry_after(response), 0)
+        response.headers['Retry-After'] = 'soon'
+        self.assertIsNone(utils.retry_after(response))